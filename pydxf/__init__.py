@@ -1,12 +1,215 @@
+import collections
+import contextlib
+import cPickle
 import io
+import multiprocessing
 import pydxf
+import Queue
+import section
+import snapshot
 import tools
 
 
-def open_path(file_path):
+def open_path(file_path, mmap=False, lazy=False, sections=None, workers=None, cache=None, entity_types=None,
+              layers=None):
+    ''' Parse the DXF file at file_path into a DxfFile. Both ASCII and binary DXF files are accepted; the format is
+        detected from the file contents.
+        mmap - Map the file into memory and tokenize its raw bytes in place rather than reading it as text. Record
+               values are then only decoded, using the drawing's $DWGCODEPAGE, when they are read.
+        lazy - Only index the sections of the file up front, and parse each section when it is first accessed through
+               DxfFile.sections. The file stays mapped into memory while the DxfFile is alive. Binary files have no
+               cheap section index and are always parsed eagerly.
+        sections - Names of the sections to load, for example ('HEADER', 'ENTITIES'). Other sections are skipped while
+                   tokenizing, so no records or section objects are ever made for them. By default all are loaded.
+        workers - Parse the ENTITIES section of an ASCII file in a pool of this many processes. Worthwhile for large
+                  files only, since each worker has to send its entities back to this process. Ignored for lazy loading
+                  and for binary files, which are parsed in this process. If a worker process dies, for example killed
+                  by the OS for running out of memory, a RuntimeError is raised.
+        cache - A cache.DxfCache to look the file up in before parsing it, and to store it in afterwards. Files from
+                the cache are always fully loaded, so lazy is ignored.
+        entity_types - Types of entity to load from the ENTITIES section, for example ('LINE', 'ARC', 'CIRCLE').
+        layers - Names of the layers to load entities from.
+                 The records of other entities are skipped while tokenizing, along with those of unwanted sections.
+                 A POLYLINE's VERTEX and SEQEND entities are loaded or skipped along with it. By default all entities
+                 are loaded.
+    '''
+
+    if cache is not None:
+        key = cache.key(file_path, sections, entity_types, layers, mmap)
+        dxf_file = cache.get(key)
+        if dxf_file is None:
+            dxf_file = open_path(file_path, mmap, sections=sections, workers=workers, entity_types=entity_types,
+                                 layers=layers)
+            cache.put(key, dxf_file)
+        return dxf_file
+
+    if lazy:
+        with open(file_path, 'rb') as fi:
+            binary = tools.is_binary_dxf(fi)
+            if not binary:
+                buf = tools.map_file(fi)
+
+        if not binary:
+            if not tools.is_ascii_dxf(buf):
+                buf.close()
+                raise pydxf.FormatException('File does not appear to be ASCII or binary DXF')
+            return pydxf.DxfFile.make_lazy_file(buf, sections, entity_types, layers)
+
+    if workers > 1:
+        with open(file_path, 'rb') as fi:
+            binary = tools.is_binary_dxf(fi)
+            if not binary:
+                buf = tools.map_file(fi)
+
+        if not binary:
+            with contextlib.closing(buf):
+                if not tools.is_ascii_dxf(buf):
+                    raise pydxf.FormatException('File does not appear to be ASCII or binary DXF')
+                return pydxf.DxfFile.make_parallel_file(file_path, buf, workers, sections, entity_types, layers)
+
+    with _open_records(file_path, mmap, sections, entity_types, layers) as records:
+        return pydxf.DxfFile.make_file(records, sections)
+
+
+def iter_entities(path_or_stream, mmap=False, entity_types=None, layers=None):
+    ''' Generate the entities of a DXF file's ENTITIES section one at a time, as each one is completed, without building
+        a DxfFile. Memory use is bounded by the size of the largest entity rather than the size of the drawing.
+        path_or_stream - A file path, or a stream holding an ASCII or binary DXF file.
+        mmap - As for open_path. Ignored for streams.
+        entity_types, layers - As for open_path.
+    '''
+
+    if hasattr(path_or_stream, 'read'):
+        records = tools.stream_record_iterator(path_or_stream, entity_types=entity_types, layers=layers)
+        for entity in section.EntitiesSection.iter_entities(records):
+            yield entity
+        return
+
+    with _open_records(path_or_stream, mmap, entity_types=entity_types, layers=layers) as records:
+        for entity in section.EntitiesSection.iter_entities(records):
+            yield entity
+
+
+def load_snapshot(path):
+    ''' Read a DxfFile from a snapshot written by DxfFile.save_snapshot. Only the section and array data is read up
+        front; the entity objects are made when the ENTITIES section's entities are first used.
+    '''
+    return snapshot.load(path)
+
+
+def open_many(paths, workers=None, ordered=True, max_pending=None, mmap=False, sections=None, entity_types=None,
+              layers=None, process=None):
+    ''' Parse many DXF files with open_path in a pool of worker processes, generating a (path, result) pair for each
+        path, where result is the DxfFile or the exception raised while parsing it.
+        paths - Iterable of file paths. It is only consumed as fast as files are parsed.
+        workers - Number of worker processes; by default one per CPU. With 1, files are parsed in this process.
+        ordered - Generate the pairs in the order of paths. Otherwise each pair is generated as soon as its file has
+                  been parsed.
+        max_pending - Most files being parsed, or parsed but not yet generated, at once. This bounds the memory held by
+                      finished DxfFiles waiting behind a slow file. Defaults to twice the number of workers.
+        mmap, sections, entity_types, layers - As for open_path.
+        process - Function called in the worker as process(path, dxf_file) with each parsed file. Its return value is
+                  sent back as the result in place of the DxfFile, which saves pickling whole files when only a little
+                  is needed from each. It must be picklable, so a module level function.
+        If a worker process dies, for example killed by the OS for running out of memory, the file it was parsing never
+        gets a result, so a RuntimeError is raised instead of waiting for it.
+    '''
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    if workers <= 1:
+        for path in paths:
+            yield path, _open_processed(path, mmap, sections, entity_types, layers, process)
+        return
+
+    if max_pending is None:
+        max_pending = workers * 2
+
+    paths = iter(paths)
+    pool = multiprocessing.Pool(workers)
+    worker_pids = tools.pool_worker_pids(pool)
+    try:
+        if ordered:
+            pending = collections.deque()
+            for path in paths:
+                pending.append(pool.apply_async(_open_pickled, (path, mmap, sections, entity_types, layers, process)))
+                if len(pending) >= max_pending:
+                    yield _unpickle_result(tools.wait_pool_result(pool, worker_pids, pending.popleft().get))
+            while pending:
+                yield _unpickle_result(tools.wait_pool_result(pool, worker_pids, pending.popleft().get))
+        else:
+            done = Queue.Queue()
+            in_flight = 0
+            for path in paths:
+                pool.apply_async(_open_pickled, (path, mmap, sections, entity_types, layers, process),
+                                 callback=done.put)
+                in_flight += 1
+                if in_flight >= max_pending:
+                    yield _unpickle_result(tools.wait_pool_result(pool, worker_pids, done.get))
+                    in_flight -= 1
+            for i in xrange(in_flight):
+                yield _unpickle_result(tools.wait_pool_result(pool, worker_pids, done.get))
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _open_processed(path, mmap, sections, entity_types, layers, process):
+    # Parse one file for open_many, returning the DxfFile, or what process makes of it, or the exception raised.
+    try:
+        dxf_file = open_path(path, mmap=mmap, sections=sections, entity_types=entity_types, layers=layers)
+        return dxf_file if process is None else process(path, dxf_file)
+    except Exception as e:
+        return e
+
+
+def _open_pickled(path, mmap, sections, entity_types, layers, process):
+    # Worker of open_many. The result is pickled here so that a result that can't be pickled is reported as an error
+    # for its path, rather than failing inside the pool where no result would ever come back for it.
+    result = _open_processed(path, mmap, sections, entity_types, layers, process)
+
+    try:
+        return path, cPickle.dumps(result, cPickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        return path, cPickle.dumps(RuntimeError('Could not send the result for %s back: %r' % (path, e)),
+                                   cPickle.HIGHEST_PROTOCOL)
+
+
+def _unpickle_result(result):
+    path, pickled = result
+    return path, cPickle.loads(pickled)
+
+
+@contextlib.contextmanager
+def _open_records(file_path, mmap=False, sections=None, entity_types=None, layers=None):
+    ''' Context manager giving an iterator over the DxfRecords of the DXF file at file_path, whatever its format.
+    '''
+
+    with open(file_path, 'rb') as fi:
+        binary = tools.is_binary_dxf(fi)
+        fi.seek(0, io.SEEK_SET)
+
+        if not mmap:
+            if binary:
+                yield tools.binary_record_iterator(fi, sections, entity_types, layers)
+                return
+        else:
+            buf = tools.map_file(fi)
+
+    if mmap:
+        with contextlib.closing(buf):
+            if binary:
+                yield tools.binary_record_iterator(buf, sections, entity_types, layers)
+            else:
+                if not tools.is_ascii_dxf(buf):
+                    raise pydxf.FormatException('File does not appear to be ASCII or binary DXF')
+                yield tools.mmap_record_iterator(buf, sections=sections, entity_types=entity_types, layers=layers)
+        return
+
     with open(file_path, 'rt') as fi:
         if not tools.is_ascii_dxf(fi):
-            raise pydxf.FormatException('File does not appear to be ASCII DXF')
+            raise pydxf.FormatException('File does not appear to be ASCII or binary DXF')
 
         fi.seek(0, io.SEEK_SET)
-        return pydxf.DxfFile.make_file(tools.ascii_record_iterator(fi))
+        yield tools.ascii_record_iterator(fi, sections=sections, entity_types=entity_types, layers=layers)
@@ -0,0 +1,180 @@
+import cPickle
+import errno
+import hashlib
+import os
+import tempfile
+import zlib
+
+
+# Bump when the cached form of a DxfFile changes in a way the source digest below wouldn't catch.
+FORMAT_VERSION = 1
+
+ENTRY_SUFFIX = '.dxfcache'
+
+
+class DxfCache(object):
+    ''' On-disk cache of parsed DxfFiles, for use with pydxf.open_path(..., cache=...). Entries are pickled, compressed
+        DxfFiles stored one per file in a directory, which may be shared between processes.
+
+        Entries are stamped with a version made from FORMAT_VERSION and a digest of pydxf's own source, so entries
+        written by any other version of pydxf are treated as missing. Once the entries take up more than max_size bytes,
+        the least recently used ones are removed.
+
+        Entries are read back with cPickle, which can run arbitrary code, so anyone who can write to the directory can
+        run code in every process that uses the cache. Only use a directory that no untrusted user can write to. A
+        directory created here is only accessible by its owner.
+
+        directory - Where to keep the entries. Created, with mode 0700, if it doesn't exist.
+        max_size - Total size in bytes of the entries to keep.
+        key - 'content' to key entries by a hash of the file's contents, or 'stat' to key them by the file's path, size
+              and modification time. 'stat' avoids reading the whole file on every lookup, but is fooled by changes
+              that keep the size and modification time.
+        compress_level - zlib compression level for the entries, or 0 to store them uncompressed.
+    '''
+
+    def __init__(self, directory, max_size=1 << 30, key='content', compress_level=1):
+        if key not in ('content', 'stat'):
+            raise ValueError('key must be \'content\' or \'stat\', not %r' % (key,))
+
+        self.directory = directory
+        self.max_size = max_size
+        self.key_type = key
+        self.compress_level = compress_level
+
+        try:
+            os.makedirs(directory, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def key(self, file_path, sections=None, entity_types=None, layers=None, mmap=False):
+        ''' Return the key of the entry for the DXF file at file_path parsed with the given open_path sections,
+            entity_types, layers and mmap. Files parsed with and without mmap are kept apart, since their record values
+            differ in type.
+        '''
+
+        digest = hashlib.sha1()
+        if self.key_type == 'content':
+            with open(file_path, 'rb') as fi:
+                for chunk in iter(lambda: fi.read(1 << 20), b''):
+                    digest.update(chunk)
+        else:
+            stat = os.stat(file_path)
+            digest.update('%s\0%d\0%r' % (os.path.abspath(file_path), stat.st_size, stat.st_mtime))
+
+        for names in (sections, entity_types, layers):
+            # Each filter is marked off, so that the same names given as a different filter give a different key.
+            digest.update('\1')
+            if names is not None:
+                digest.update('\0' + '\0'.join(sorted(name.encode('utf-8') if isinstance(name, unicode) else name
+                                                        for name in names)))
+        digest.update('\1mmap' if mmap else '\1')
+        return digest.hexdigest()
+
+    def get(self, key):
+        ''' Return the DxfFile stored under key, or None if there isn't one written by this version of pydxf.
+        '''
+
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as fi:
+                stamp = fi.readline().rstrip('\n')
+                data = fi.read()
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+
+        stamp, _, compression = stamp.rpartition(' ')
+        if stamp != _version_stamp():
+            self._remove(path)
+            return None
+
+        try:
+            dxf_file = cPickle.loads(zlib.decompress(data) if compression == 'zlib' else data)
+        except Exception:
+            # Partly written by a process that died, or otherwise corrupt. Parsing the file again fixes it.
+            self._remove(path)
+            return None
+
+        # The modification time of an entry records when it was last used.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return dxf_file
+
+    def put(self, key, dxf_file):
+        ''' Store a DxfFile under key, then remove the least recently used entries if the cache has grown too big.
+            Lazily loaded DxfFiles have all of their sections loaded and are stored as ordinary DxfFiles.
+        '''
+
+        data = cPickle.dumps(dxf_file, cPickle.HIGHEST_PROTOCOL)
+        if self.compress_level:
+            data = zlib.compress(data, self.compress_level)
+
+        # Write to a temporary file and rename it into place, so that other processes never see a partial entry.
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as fo:
+                fo.write('%s %s\n' % (_version_stamp(), 'zlib' if self.compress_level else 'raw'))
+                fo.write(data)
+            os.rename(temp_path, self._entry_path(key))
+        except:
+            self._remove(temp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        ''' Remove the least recently used entries until the cache takes up no more than max_size bytes.
+        '''
+
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for used, size, path in entries)
+        for used, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                self._remove(os.path.join(self.directory, name))
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_stamp = None
+
+
+def _version_stamp():
+    # FORMAT_VERSION and a digest of the package source, so that any change to pydxf invalidates existing entries.
+    global _stamp
+    if _stamp is None:
+        digest = hashlib.sha1()
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(package_dir)):
+            if name.endswith('.py'):
+                with open(os.path.join(package_dir, name), 'rb') as fi:
+                    digest.update(fi.read())
+        _stamp = 'pydxf-cache %d %s' % (FORMAT_VERSION, digest.hexdigest())
+    return _stamp
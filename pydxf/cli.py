@@ -0,0 +1,79 @@
+import argparse
+import collections
+import json
+import os
+import sys
+from . import open_many
+
+
+def find_dxf_files(root):
+    ''' Generate the paths of the .dxf files under root, in sorted order. root may also be a single file.
+    '''
+
+    if not os.path.isdir(root):
+        yield root
+        return
+
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith('.dxf'):
+                yield os.path.join(dir_path, file_name)
+
+
+def summarize(path, dxf_file):
+    ''' Return a dict summarizing a parsed DXF file: its sections, entity counts by type, layers and extents. Run
+        in the open_many workers, so that only the summary is sent back rather than the whole file.
+    '''
+
+    entities_sec = dxf_file.sections.get('ENTITIES')
+    entities = entities_sec.entities if entities_sec else []
+    return collections.OrderedDict([
+        ('path', path),
+        ('sections', list(dxf_file.sections)),
+        ('entities', len(entities)),
+        ('entity_types', dict(collections.Counter(ent.name for ent in entities))),
+        ('layers', len(dxf_file.layers)),
+        ('extents', dxf_file.extents),
+    ])
+
+
+def main(argv=None):
+    ''' Parse every DXF file in a directory tree and write a summary report, one line per file, followed by totals.
+    '''
+
+    parser = argparse.ArgumentParser(description='Summarize the DXF files in a directory tree.')
+    parser.add_argument('paths', nargs='+', help='DXF files or directories to search for .dxf files')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--unordered', action='store_true', help='report files as they finish rather than in order')
+    parser.add_argument('--json', action='store_true', help='write one JSON object per file')
+    args = parser.parse_args(argv)
+
+    paths = (path for root in args.paths for path in find_dxf_files(root))
+    totals = collections.Counter()
+
+    for path, result in open_many(paths, workers=args.workers, ordered=not args.unordered, process=summarize):
+        totals['files'] += 1
+        if isinstance(result, Exception):
+            totals['failed'] += 1
+            summary = collections.OrderedDict([('path', path), ('error', '%s: %s' % (type(result).__name__, result))])
+        else:
+            summary = result
+            totals['entities'] += summary['entities']
+
+        if args.json:
+            sys.stdout.write(json.dumps(summary) + '\n')
+        elif 'error' in summary:
+            sys.stdout.write('%s\tERROR\t%s\n' % (path, summary['error']))
+        else:
+            types = ' '.join('%s=%d' % item for item in sorted(summary['entity_types'].iteritems()))
+            extents = ' '.join('%g' % value for value in summary['extents']) if summary['extents'] else '-'
+            sys.stdout.write('%s\t%d entities\t%d layers\t%s\t%s\n' % (
+                path, summary['entities'], summary['layers'], extents, types))
+
+    sys.stderr.write('%d files, %d failed, %d entities\n' % (totals['files'], totals['failed'], totals['entities']))
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
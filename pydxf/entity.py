@@ -1,16 +1,63 @@
+import array
 import collections
+import itertools
 import pydxf
 from . import tools
 
 
+class FieldSchema(object):
+    ''' Declarative description of the group codes an entity type parses into attributes. fields maps each group code
+        to an (attribute, converter) pair, where converter is applied to the record value (None keeps the value as it
+        is) and an attribute of None drops the record. Records with any other code are kept in the entity's records.
+        The mapping is compiled once into dispatch, a dict from group code to a pair, so parsing a record is a single
+        lookup however many codes the type handles.
+    '''
+
+    def __init__(self, fields):
+        self.fields = dict(fields)
+        self.dispatch = dict((int(code), (attribute, converter)) for code, (attribute, converter) in
+                             self.fields.iteritems())
+
+    def extend(self, fields):
+        ''' Return a new schema with the fields of this one, plus or overridden by the given fields.
+        '''
+        combined = dict(self.fields)
+        combined.update(fields)
+        return FieldSchema(combined)
+
+    def parse(self, entity, records, start=0):
+        ''' Set the attributes of entity from records[start:], keeping the records that aren't fields. Returns entity.
+        '''
+        self.parse_into(entity.__dict__, entity._records.append, records, start)
+        return entity
+
+    def parse_into(self, state, keep, records, start=0):
+        ''' Like parse, but store the field values in the dict state, keyed by attribute, and call keep with each of
+            the other records. For parts of an entity that aren't entity objects themselves, such as vertices.
+        '''
+
+        get = self.dispatch.get
+
+        for rec in itertools.islice(records, start, None) if start else records:
+            field = get(rec.code)
+            if field is None:
+                keep(rec)
+            else:
+                attribute, converter = field
+                if attribute is not None:
+                    state[attribute] = rec.value if converter is None else converter(rec.value)
+
 
 class DxfEntity(object):
 
     entity_factories = None
 
+    # Fields shared by all entities.
+    FIELDS = FieldSchema({8: ('layer_name', None)})
+
     def __init__(self):
         self.name = ''
-        self._records = []
+        self._records = pydxf.DxfRecordList()
         self.layer_name = ''
 
     def add_records(self, record):
@@ -20,19 +67,35 @@ class DxfEntity(object):
     def records(self):
         return self._records
 
+    def extents(self):
+        ''' Return the (xmin, ymin, xmax, ymax) bounding box of the entity in world coordinates, or None if the
+            entity has no geometry pydxf understands.
+        '''
+        return None
+
+    def iter_records(self):
+        ''' Return a list of the records to write the entity out with: its (0, type) record, then the records it
+            kept with its parsed attributes merged back in among them by tools.layout_records.
+        '''
+
+        common = [pydxf.DxfRecord(8, self.layer_name)] if self.layer_name else []
+        records = tools.layout_records(self._records, common, self._field_records(), self._tail_records())
+        records.insert(0, pydxf.DxfRecord(0, self.name))
+        return records
+
+    def _field_records(self):
+        # Records for the attributes parsed out of the entity's records, other than the layer.
+        return []
+
+    def _tail_records(self):
+        return []
+
     @staticmethod
     def __make_default_entity(records):
         # Don't worry about error checking. Should be done already.
         entity = DxfEntity()
         entity.name = records[0].value
-
-        for rec in records[1:]:
-            if rec.code == 8:
-                entity.layer_name = rec.value
-            else:
-                entity.add_records(rec)
-
-        return entity
+        return DxfEntity.FIELDS.parse(entity, records, 1)
 
     @staticmethod
     def make_entity(records):
@@ -54,9 +117,235 @@ class DxfEntity(object):
             DxfEntity.entity_factories[cls.ENTITY_TYPE] = cls.make_entity
 
 
+class EntityColumns(object):
+    ''' Columnar copy of the geometry of all entities of one type, for vectorized processing. Every column is an
+        array.array('d') with one row per entity, in section order. The arrays support the buffer protocol, so
+        numpy.frombuffer(columns['x1']) gives a NumPy view of a column without copying it.
+        layer_index holds the index into layers of each row's layer, and entities the entity object of each row.
+    '''
+
+    def __init__(self, entity_type, column_names):
+        self.entity_type = entity_type
+        # Type of the section entities that rows are taken from.
+        self.source_type = entity_type
+        self.column_names = tuple(column_names)
+        self.layer_index = array.array('i')
+        self.layers = []
+        self.entities = []
+        # Called with the list of entities whenever update writes new values back to them, unless told not to.
+        self.on_update = None
+        self._columns = dict((name, array.array('d')) for name in self.column_names)
+        self._layer_ids = {}
+
+    @staticmethod
+    def for_type(entity_type):
+        ''' Make empty columns for an entity type that has a columnar representation.
+        '''
+
+        if entity_type == VertexEntity.ENTITY_TYPE:
+            return VertexColumns()
+
+        for cls in DxfEntity.__subclasses__():
+            if cls.ENTITY_TYPE == entity_type and getattr(cls, 'COLUMNS', None):
+                return EntityColumns(entity_type, cls.COLUMNS)
+
+        raise ValueError('{} entities have no columnar representation'.format(entity_type))
+
+    def append(self, entity):
+        for name in self.column_names:
+            self._columns[name].append(getattr(entity, name))
+
+        layer_id = self._layer_ids.get(entity.layer_name)
+        if layer_id is None:
+            layer_id = self._layer_ids[entity.layer_name] = len(self.layers)
+            self.layers.append(entity.layer_name)
+        self.layer_index.append(layer_id)
+        self.entities.append(entity)
+
+    def extend(self, entities):
+        for entity in entities:
+            self.append(entity)
+
+    def update(self, name, values, notify=True):
+        ''' Replace a whole column, writing the new values back to the entity objects as well.
+            notify - Call on_update with the entities afterwards. Pass False when updating several columns in a row, and
+                     notify the owner of the entities once when done.
+        '''
+
+        column = array.array('d', values)
+        if len(column) != len(self.entities):
+            raise ValueError('Column {} needs {} values, got {}'.format(name, len(self.entities), len(column)))
+
+        self._columns[name] = column
+        for entity, value in zip(self.entities, column):
+            setattr(entity, name, value)
+
+        if notify and self.on_update is not None:
+            self.on_update(self.entities)
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    def __len__(self):
+        return len(self.layer_index)
+
+
+class VertexColumns(EntityColumns):
+    ''' EntityColumns for the vertices of POLYLINE entities, one row per vertex. Here entities holds the polylines
+        themselves, and polyline_index the index into entities of the polyline each row belongs to.
+    '''
+
+    def __init__(self):
+        super(VertexColumns, self).__init__(VertexEntity.ENTITY_TYPE, VertexEntity.COLUMNS)
+        self.source_type = PolyLineEntity.ENTITY_TYPE
+        self.polyline_index = array.array('i')
+
+    def append(self, polyline):
+        vertices = polyline.vertices
+        for name in self.column_names:
+            self._columns[name].extend(getattr(vertices, name))
+
+        layer_id = self._layer_ids.get(polyline.layer_name)
+        if layer_id is None:
+            layer_id = self._layer_ids[polyline.layer_name] = len(self.layers)
+            self.layers.append(polyline.layer_name)
+        self.layer_index.extend(array.array('i', [layer_id]) * len(vertices))
+        self.polyline_index.extend(array.array('i', [len(self.entities)]) * len(vertices))
+        self.entities.append(polyline)
+
+    def update(self, name, values, notify=True):
+        column = array.array('d', values)
+        if len(column) != len(self):
+            raise ValueError('Column {} needs {} values, got {}'.format(name, len(self), len(column)))
+
+        self._columns[name] = column
+        start = 0
+        for polyline in self.entities:
+            end = start + len(polyline.vertices)
+            getattr(polyline.vertices, name)[:] = column[start:end]
+            start = end
+
+        if notify and self.on_update is not None:
+            self.on_update(self.entities)
+
+
+class VertexBuffer(object):
+    ''' Contiguous storage for the vertices of a polyline. Coordinates and bulges are kept in array('d') columns
+        instead of one VertexEntity per vertex, and any other records of each vertex are kept together in a single
+        DxfRecordList. Indexing or iterating produces VertexEntity copies for code that works with single vertices.
+    '''
+
+    # Fields of a VERTEX entity held in the columns. Its layer stays with its other records.
+    FIELDS = FieldSchema({
+        10: ('x', float),
+        20: ('y', float),
+        30: ('z', float),
+        42: ('bulge', float),
+    })
+
+    def __init__(self):
+        self.x = array.array('d')
+        self.y = array.array('d')
+        self.z = array.array('d')
+        self.bulge = array.array('d')
+        self._records = pydxf.DxfRecordList()
+        # Offset into _records of the first record of each vertex, plus the end offset of the last vertex.
+        self._record_starts = array.array('i', [0])
+
+    @staticmethod
+    def from_columns(x, y, z, bulge, records, record_starts):
+        ''' Make a VertexBuffer holding the given arrays, without copying them.
+        '''
+        vertices = VertexBuffer.__new__(VertexBuffer)
+        vertices.x, vertices.y, vertices.z, vertices.bulge = x, y, z, bulge
+        vertices._records = records
+        vertices._record_starts = record_starts
+        return vertices
+
+    def append(self, x, y, z=0, bulge=0, records=()):
+        self.x.append(x)
+        self.y.append(y)
+        self.z.append(z)
+        self.bulge.append(bulge)
+        self._records.extend(records)
+        self._record_starts.append(len(self._records))
+
+    def add_records(self, records):
+        ''' Append a vertex parsed from the records of a VERTEX entity.
+        '''
+
+        values = {'x': 0, 'y': 0, 'z': 0, 'bulge': 0}
+        VertexBuffer.FIELDS.parse_into(values, self._records.append, records, 1)
+
+        self.x.append(values['x'])
+        self.y.append(values['y'])
+        self.z.append(values['z'])
+        self.bulge.append(values['bulge'])
+        self._record_starts.append(len(self._records))
+
+    def extents(self, closed=False):
+        ''' Return the (xmin, ymin, xmax, ymax) bounding box of the polyline through these vertices, including the
+            arcs of bulged segments, or None if there are no vertices.
+        '''
+        return tools.polyline_extents(self.x, self.y, self.bulge, closed)
+
+    def records(self, index):
+        ''' Return the records, other than coordinates and bulge, of the vertex at index.
+        '''
+        if index < 0:
+            index += len(self)
+        return self._records[self._record_starts[index]:self._record_starts[index + 1]]
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('vertex index out of range')
+
+        vertex = VertexEntity()
+        vertex.x = self.x[index]
+        vertex.y = self.y[index]
+        vertex.z = self.z[index]
+        vertex.bulge = self.bulge[index]
+        for rec in self.records(index):
+            if rec.code == 8:
+                vertex.layer_name = rec.value
+            else:
+                vertex.add_records(rec)
+        return vertex
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self[index]
+
+    def __getstate__(self):
+        # Arrays pickle as lists of numbers; packing them is much faster and smaller.
+        return ([column.tostring() for column in (self.x, self.y, self.z, self.bulge, self._record_starts)],
+                self._records)
+
+    def __setstate__(self, state):
+        columns, self._records = state
+        self.x, self.y, self.z, self.bulge = [array.array('d') for i in range(4)]
+        self._record_starts = array.array('i')
+        for column, packed in zip((self.x, self.y, self.z, self.bulge, self._record_starts), columns):
+            column.fromstring(packed)
+
+
 class ArcEntity(DxfEntity):
 
     ENTITY_TYPE = 'ARC'
+    COLUMNS = ('x', 'y', 'radius', 'start_angle', 'end_angle', 'z_dir')
+    FIELDS = DxfEntity.FIELDS.extend({
+        10: ('x', float),
+        20: ('y', float),
+        40: ('radius', float),
+        50: ('start_angle', float),
+        51: ('end_angle', float),
+        230: ('z_dir', float),
+    })
 
     def __init__(self):
         super(ArcEntity, self).__init__()
@@ -69,34 +358,29 @@ class ArcEntity(DxfEntity):
         self.layer_name = ''
         self.z_dir = 1
 
-    @staticmethod
-    def make_entity(records):
-        entity = ArcEntity()
+    def extents(self):
+        return tools.ocs_extents(
+            tools.arc_extents(self.x, self.y, self.radius, self.start_angle, self.end_angle), self.z_dir)
 
-        for rec in records:
-            if rec.code == 8:
-                entity.layer_name = rec.value
-            elif rec.code == 10:
-                entity.x = float(rec.value)
-            elif rec.code == 20:
-                entity.y = float(rec.value)
-            elif rec.code == 40:
-                entity.radius = float(rec.value)
-            elif rec.code == 50:
-                entity.start_angle = float(rec.value)
-            elif rec.code == 51:
-                entity.end_angle = float(rec.value)
-            elif rec.code == 230:
-                entity.z_dir = float(rec.value)
-            else:
-                entity.add_records(rec)
+    def _field_records(self):
+        return [pydxf.DxfRecord(10, self.x), pydxf.DxfRecord(20, self.y), pydxf.DxfRecord(40, self.radius),
+                pydxf.DxfRecord(50, self.start_angle), pydxf.DxfRecord(51, self.end_angle)] + _z_dir_records(self)
 
-        return entity
+    @staticmethod
+    def make_entity(records):
+        return ArcEntity.FIELDS.parse(ArcEntity(), records)
 
 
 class CircleEntity(DxfEntity):
 
     ENTITY_TYPE = 'CIRCLE'
+    COLUMNS = ('x', 'y', 'radius', 'z_dir')
+    FIELDS = DxfEntity.FIELDS.extend({
+        10: ('x', float),
+        20: ('y', float),
+        40: ('radius', float),
+        230: ('z_dir', float),
+    })
 
     def __init__(self):
         super(CircleEntity, self).__init__()
@@ -107,30 +391,30 @@ class CircleEntity(DxfEntity):
         self.layer_name = ''
         self.z_dir = 1
 
-    @staticmethod
-    def make_entity(records):
-        entity = CircleEntity()
+    def extents(self):
+        return tools.ocs_extents(
+            (self.x - self.radius, self.y - self.radius, self.x + self.radius, self.y + self.radius), self.z_dir)
 
-        for rec in records:
-            if rec.code == 8:
-                entity.layer_name = rec.value
-            elif rec.code == 10:
-                entity.x = float(rec.value)
-            elif rec.code == 20:
-                entity.y = float(rec.value)
-            elif rec.code == 40:
-                entity.radius = float(rec.value)
-            elif rec.code == 230:
-                entity.z_dir = float(rec.value)
-            else:
-                entity.add_records(rec)
+    def _field_records(self):
+        return [pydxf.DxfRecord(10, self.x), pydxf.DxfRecord(20, self.y),
+                pydxf.DxfRecord(40, self.radius)] + _z_dir_records(self)
 
-        return entity
+    @staticmethod
+    def make_entity(records):
+        return CircleEntity.FIELDS.parse(CircleEntity(), records)
 
 
 class LineEntity(DxfEntity):
 
     ENTITY_TYPE = 'LINE'
+    COLUMNS = ('x1', 'y1', 'x2', 'y2', 'z_dir')
+    FIELDS = DxfEntity.FIELDS.extend({
+        10: ('x1', float),
+        20: ('y1', float),
+        11: ('x2', float),
+        21: ('y2', float),
+        230: ('z_dir', float),
+    })
 
     def __init__(self):
         super(LineEntity, self).__init__()
@@ -142,25 +426,109 @@ class LineEntity(DxfEntity):
         self.y2 = 0
         self.z_dir = 1
 
+    def extents(self):
+        # Line end points are in world coordinates, whatever the extrusion direction.
+        return min(self.x1, self.x2), min(self.y1, self.y2), max(self.x1, self.x2), max(self.y1, self.y2)
+
+    def _field_records(self):
+        return [pydxf.DxfRecord(10, self.x1), pydxf.DxfRecord(20, self.y1), pydxf.DxfRecord(11, self.x2),
+                pydxf.DxfRecord(21, self.y2)] + _z_dir_records(self)
+
     @staticmethod
     def make_entity(records):
-        entity = LineEntity()
+        return LineEntity.FIELDS.parse(LineEntity(), records)
+
+
+class LwPolyLineEntity(DxfEntity):
+
+    ENTITY_TYPE = 'LWPOLYLINE'
+    FIELDS = DxfEntity.FIELDS.extend({
+        70: ('flags', int),
+        38: ('elevation', float),
+        43: ('constant_width', float),
+        230: ('z_dir', float),
+        # Vertex count, implied by the vertices themselves.
+        90: (None, None),
+    })
+    # Fields of each vertex. Start and end widths (40, 41) and vertex ids (91) are kept with the vertex's records.
+    VERTEX_FIELDS = FieldSchema({
+        10: ('x', float),
+        20: ('y', float),
+        42: ('bulge', float),
+    })
+    # Codes that belong to the current vertex once one has started.
+    VERTEX_CODES = frozenset((20, 40, 41, 42, 91))
+
+    # Bits of the polyline flags (group code 70).
+    CLOSED = 1
+
+    def __init__(self):
+        super(LwPolyLineEntity, self).__init__()
+        self.name = LwPolyLineEntity.ENTITY_TYPE
+        self.layer_name = ''
+        self.flags = 0
+        self.elevation = 0
+        self.constant_width = 0
+        self.z_dir = 1
+        # Vertex z coordinates are all the polyline's elevation. Start and end widths and vertex ids are kept with
+        # each vertex's records.
+        self.vertices = VertexBuffer()
+
+    @property
+    def closed(self):
+        return bool(self.flags & LwPolyLineEntity.CLOSED)
+
+    def extents(self):
+        return tools.ocs_extents(self.vertices.extents(self.closed), self.z_dir)
+
+    def _field_records(self):
+        records = [pydxf.DxfRecord(90, len(self.vertices)), pydxf.DxfRecord(70, self.flags)]
+        if self.constant_width:
+            records.append(pydxf.DxfRecord(43, self.constant_width))
+        if self.elevation:
+            records.append(pydxf.DxfRecord(38, self.elevation))
+        return records + _z_dir_records(self)
+
+    def _tail_records(self):
+        records = []
+        vertices = self.vertices
+        for index in xrange(len(vertices)):
+            records.append(pydxf.DxfRecord(10, vertices.x[index]))
+            records.append(pydxf.DxfRecord(20, vertices.y[index]))
+            records.extend(vertices.records(index))
+            if vertices.bulge[index]:
+                records.append(pydxf.DxfRecord(42, vertices.bulge[index]))
+        return records
 
+    @staticmethod
+    def make_entity(records):
+        entity = LwPolyLineEntity()
+        vertices = entity.vertices
+
+        # The repeating vertex groups start with code 10, and codes 20, 40, 41, 42 and 91 that follow belong to the
+        # vertex started last. The records are split into the polyline's own and those of each vertex, and then each
+        # part goes through its schema.
+        entity_records = []
+        vertex_groups = []
+        vertex_codes = LwPolyLineEntity.VERTEX_CODES
         for rec in records:
-            if rec.code == 8:
-                entity.layer_name = rec.value
-            elif rec.code == 10:
-                entity.x1 = float(rec.value)
-            elif rec.code == 11:
-                entity.x2 = float(rec.value)
-            elif rec.code == 20:
-                entity.y1 = float(rec.value)
-            elif rec.code == 21:
-                entity.y2 = float(rec.value)
-            elif rec.code == 230:
-                entity.z_dir = float(rec.value)
+            code = rec.code
+            if code == 10:
+                group = [rec]
+                vertex_groups.append(group)
+            elif vertex_groups and code in vertex_codes:
+                group.append(rec)
             else:
-                entity.add_records(rec)
+                entity_records.append(rec)
+
+        LwPolyLineEntity.FIELDS.parse(entity, entity_records)
+
+        parse_vertex = LwPolyLineEntity.VERTEX_FIELDS.parse_into
+        for group in vertex_groups:
+            values = {'y': 0, 'bulge': 0}
+            vertex_records = []
+            parse_vertex(values, vertex_records.append, group)
+            vertices.append(values['x'], values['y'], entity.elevation, values['bulge'], vertex_records)
 
         return entity
 
@@ -168,28 +536,65 @@ class LineEntity(DxfEntity):
 class PolyLineEntity(DxfEntity):
 
     ENTITY_TYPE = 'POLYLINE'
+    FIELDS = DxfEntity.FIELDS.extend({
+        70: ('flags', int),
+    })
+
+    # Bits of the polyline flags (group code 70).
+    CLOSED = 1
 
     def __init__(self):
         super(PolyLineEntity, self).__init__()
         self.name = PolyLineEntity.ENTITY_TYPE
         self.layer_name = ''
+        self.flags = 0
+        # Filled in from the VERTEX entities and the SEQEND entity following the polyline in the ENTITIES section.
+        self.vertices = VertexBuffer()
+        self.seqend = None
 
-    @staticmethod
-    def make_entity(records):
-        entity = PolyLineEntity()
+    @property
+    def closed(self):
+        return bool(self.flags & PolyLineEntity.CLOSED)
 
-        for rec in records:
-            if rec.code == 8:
-                entity.layer_name = rec.value
-            else:
-                entity.add_records(rec)
+    def extents(self):
+        return self.vertices.extents(self.closed)
 
-        return entity
+    def iter_records(self):
+        ''' Return the records of the polyline followed by those of its VERTEX entities and its SEQEND.
+        '''
+
+        records = super(PolyLineEntity, self).iter_records()
+
+        vertices = self.vertices
+        for index in xrange(len(vertices)):
+            records.append(pydxf.DxfRecord(0, VertexEntity.ENTITY_TYPE))
+            fields = [pydxf.DxfRecord(10, vertices.x[index]), pydxf.DxfRecord(20, vertices.y[index]),
+                      pydxf.DxfRecord(30, vertices.z[index])]
+            if vertices.bulge[index]:
+                fields.append(pydxf.DxfRecord(42, vertices.bulge[index]))
+            records.extend(tools.layout_records(vertices.records(index), fields=fields))
+
+        if self.seqend is not None:
+            records.extend(self.seqend.iter_records())
+        else:
+            records.append(pydxf.DxfRecord(0, SeqEndEntity.ENTITY_TYPE))
+            if self.layer_name:
+                records.append(pydxf.DxfRecord(8, self.layer_name))
+        return records
+
+    def _field_records(self):
+        return [pydxf.DxfRecord(70, self.flags)]
+
+    @staticmethod
+    def make_entity(records):
+        return PolyLineEntity.FIELDS.parse(PolyLineEntity(), records)
 
 
 class VertexEntity(DxfEntity):
 
     ENTITY_TYPE = 'VERTEX'
+    COLUMNS = ('x', 'y', 'z', 'bulge')
+    FIELDS = DxfEntity.FIELDS.extend(VertexBuffer.FIELDS.fields)
 
     def __init__(self):
         super(VertexEntity, self).__init__()
@@ -200,30 +605,25 @@ class VertexEntity(DxfEntity):
         self.z = 0
         self.bulge = 0
 
-    @staticmethod
-    def make_entity(records):
-        entity = VertexEntity()
+    def extents(self):
+        return self.x, self.y, self.x, self.y
 
-        for rec in records:
-            if rec.code == 8:
-                entity.layer_name = rec.value
-            elif rec.code == 10:
-                entity.x = float(rec.value)
-            elif rec.code == 20:
-                entity.y = float(rec.value)
-            elif rec.code == 30:
-                entity.z = float(rec.value)
-            elif rec.code == 42:
-                entity.bulge = float(rec.value)
-            else:
-                entity.add_records(rec)
+    def _field_records(self):
+        records = [pydxf.DxfRecord(10, self.x), pydxf.DxfRecord(20, self.y), pydxf.DxfRecord(30, self.z)]
+        if self.bulge:
+            records.append(pydxf.DxfRecord(42, self.bulge))
+        return records
 
-        return entity
+    @staticmethod
+    def make_entity(records):
+        return VertexEntity.FIELDS.parse(VertexEntity(), records)
 
 
 class SeqEndEntity(DxfEntity):
 
     ENTITY_TYPE = 'SEQEND'
+    # SEQEND keeps all of its records, including its layer.
+    FIELDS = FieldSchema({})
 
     def __init__(self):
         super(SeqEndEntity, self).__init__()
@@ -232,9 +632,9 @@ class SeqEndEntity(DxfEntity):
 
     @staticmethod
     def make_entity(records):
-        entity = SeqEndEntity()
+        return SeqEndEntity.FIELDS.parse(SeqEndEntity(), records)
 
-        for rec in records:
-            entity.add_records(rec)
 
-        return entity
+def _z_dir_records(entity):
+    # The extrusion direction is only written when it isn't the default of +z.
+    return [pydxf.DxfRecord(230, entity.z_dir)] if entity.z_dir != 1 else []
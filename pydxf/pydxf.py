@@ -1,4 +1,8 @@
-from . import section, table, tools
+import array
+import collections
+import itertools
+import multiprocessing
+from . import section, snapshot, table, tools, writer
 
 
 
@@ -18,6 +22,9 @@ class DxfRecord(object):
     # Record values of None are a special case created for defining 'rules' for the block iterator function. They
     # have no real meaning when it comes to DXF files. Might be helpful to break rules into a different class.
 
+    # Drawings have millions of records, so they don't get a __dict__ each.
+    __slots__ = ('code', 'value')
+
     def __init__(self, code, value):
         self.code = int(code)
         self.value = value
@@ -51,26 +58,151 @@ class DxfRecord(object):
         return 'DxfRecord<%s, %s>' % (self.code, self.value)
 
 
+class EncodedDxfRecord(DxfRecord):
+    ''' A DxfRecord whose value was read as raw bytes. The value is only decoded, using the codepage of the drawing it
+        came from, when it is first read.
+    '''
+
+    __slots__ = ('_raw', '_codepage')
+
+    def __init__(self, code, raw, codepage):
+        self.code = code
+        self._raw = raw
+        self._codepage = codepage
+
+    @property
+    def value(self):
+        if self._codepage is not None:
+            self._raw = self._raw.decode(self._codepage.encoding, 'replace')
+            self._codepage = None
+        return self._raw
+
+    @value.setter
+    def value(self, value):
+        self._raw = value
+        self._codepage = None
+
+
+class DxfRecordList(object):
+    ''' Compact, list-like store of DxfRecords. Group codes are kept in an array of shorts and values in a plain list,
+        instead of keeping one object per record. Indexing and iterating produce DxfRecords on the fly, so changes to
+        those records are not written back; use append/extend, or the codes and values properties, to modify the store.
+        EncodedDxfRecords, as made by the mmap and binary parsers, are the exception: they are stored whole so that
+        their values are still decoded lazily, and take as much memory as they would in a list.
+    '''
+
+    __slots__ = ('_codes', '_values')
+
+    def __init__(self, records=()):
+        self._codes = array.array('h')
+        self._values = []
+        self.extend(records)
+
+    def append(self, record):
+        self._codes.append(record.code)
+        # Records that have not decoded their value yet are kept whole so that they still decode lazily.
+        self._values.append(record.value if type(record) is DxfRecord else record)
+
+    def extend(self, records):
+        if isinstance(records, DxfRecordList):
+            self._codes.extend(records._codes)
+            self._values.extend(records._values)
+        else:
+            if not isinstance(records, list):
+                records = list(records)
+            self._codes.extend([record.code for record in records])
+            self._values.extend([record.value if type(record) is DxfRecord else record for record in records])
+
+    @property
+    def codes(self):
+        return self._codes
+
+    @property
+    def values(self):
+        return [value.value if isinstance(value, DxfRecord) else value for value in self._values]
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            result = DxfRecordList()
+            result._codes = self._codes[index]
+            result._values = self._values[index]
+            return result
+
+        value = self._values[index]
+        if isinstance(value, DxfRecord):
+            return value
+        return DxfRecord(self._codes[index], value)
+
+    def __iter__(self):
+        for code, value in itertools.izip(self._codes, self._values):
+            yield value if isinstance(value, DxfRecord) else DxfRecord(code, value)
+
+    @staticmethod
+    def from_columns(codes, values):
+        ''' Make a DxfRecordList holding an array('h') of group codes and a list of the matching values, without
+            copying either.
+        '''
+        records = DxfRecordList.__new__(DxfRecordList)
+        records._codes = codes
+        records._values = values
+        return records
+
+    def __getstate__(self):
+        # Pickling each lazily decoded record whole is far slower than pickling its decoded value.
+        # Arrays pickle as lists of numbers, so the codes are packed into a string as well.
+        return (self._codes.tostring(),
+                [value.value if type(value) is EncodedDxfRecord else value for value in self._values])
+
+    def __setstate__(self, state):
+        codes, self._values = state
+        self._codes = array.array('h')
+        self._codes.fromstring(codes)
+
+    def __repr__(self):
+        return 'DxfRecordList<%s>' % ', '.join(repr(record) for record in self)
+
+
 class DxfFile(object):
 
     section_factories = {}
 
     def __init__(self):
         self._sections = {}
+        # The layers property, and what it was built from.
+        self._layers = None
+        self._layers_key = None
 
     @staticmethod
-    def make_file(records):
+    def make_file(records, sections=None):
         ''' Construct a DxfFile from an iterable of DxfRecords.
+            sections - Names of the sections to build. The records of any other section are skipped without being
+                       buffered or passed to a section factory. By default every section is built.
         '''
 
         dxf_file = DxfFile()
 
-        # State machine with two states. Either putting together records to construct a section, or not.
+        # State machine with three states. Either putting together records to construct a section, skipping over the
+        # records of an unwanted section, or neither.
         building_section_records = False
+        skipping_section_records = False
         section_records = []
 
         for rec in records:
             if building_section_records:
+                if skipping_section_records:
+                    if rec.is_section_end():
+                        building_section_records = False
+                        skipping_section_records = False
+                    continue
+
+                if sections is not None and len(section_records) == 1 and rec.code == 2 and \
+                        rec.value not in sections:
+                    skipping_section_records = True
+                    continue
+
                 section_records.append(rec)
                 if rec.is_section_end():
                     building_section_records = False
@@ -91,7 +223,7 @@ class DxfFile(object):
                 #    # Got some other top-level record. I think this indicates an error with the file.
                 #    pass
 
-        if building_section_records:
+        if building_section_records and not skipping_section_records:
             # The file appears to have been truncated because we never got an ENDSEC for the last section we were
             # working on. LibreCAD seems to create files like this.
             section_records.append(DxfRecord(0, 'ENDSEC'))
@@ -100,26 +232,211 @@ class DxfFile(object):
 
         return dxf_file
 
+    @staticmethod
+    def make_lazy_file(buf, sections=None, entity_types=None, layers=None):
+        ''' Construct a DxfFile from a buffer holding an ASCII DXF file, such as a memory map from tools.map_file,
+            without parsing any of its sections. The sections are located with a quick scan of the buffer, and each one
+            is only parsed when it is first looked up in sections. The buffer must stay open while the file is in use.
+            sections - Names of the sections to make available. By default every section is.
+            entity_types, layers - Only keep the entities of these types and on these layers, as for
+                                   tools.ascii_record_iterator.
+        '''
+
+        index = tools.index_sections(buf)
+        if sections is not None:
+            index = [entry for entry in index if entry[0] in sections or entry[0] == 'HEADER']
+
+        dxf_file = DxfFile()
+        dxf_file._sections = LazySections(buf, index, sections, entity_types, layers)
+        return dxf_file
+
+    @staticmethod
+    def make_parallel_file(file_path, buf, workers, sections=None, entity_types=None, layers=None):
+        ''' Construct a DxfFile from a buffer holding the ASCII DXF file at file_path, parsing its ENTITIES section in a
+            pool of worker processes. The section is split into ranges at entity boundaries with
+            tools.split_entity_ranges; each worker maps file_path itself and parses one range, and the entities are
+            merged back in file order. The other sections are parsed in this process while the workers run.
+            workers - Number of worker processes.
+            sections - As for make_file.
+            entity_types, layers - As for make_lazy_file.
+        '''
+
+        index = tools.index_sections(buf)
+        codepage = tools.read_codepage(buf, index)
+        dxf_file = DxfFile()
+
+        pool = multiprocessing.Pool(workers)
+        worker_pids = tools.pool_worker_pids(pool)
+        try:
+            pending = []
+            for name, start, end in index:
+                if sections is not None and name not in sections:
+                    continue
+
+                if name == section.EntitiesSection.SECTION_TYPE:
+                    # A few ranges per worker evens out the load when entity sizes vary across the section.
+                    pending = [pool.apply_async(section.parse_entities_range, (file_path, range_start, range_end,
+                                                                                codepage.encoding, entity_types,
+                                                                                layers))
+                               for range_start, range_end in tools.split_entity_ranges(buf, start, end, workers * 4)]
+                    dxf_file._sections[name] = section.EntitiesSection()
+                else:
+                    dxf_file._sections[name] = _make_section_from_range(buf, start, end, codepage, entity_types,
+                                                                        layers)
+
+            for result in pending:
+                entities, top_level_records = tools.wait_pool_result(pool, worker_pids, result.get)
+                entities_sec = dxf_file._sections[section.EntitiesSection.SECTION_TYPE]
+                entities_sec.add_entities(entities)
+                entities_sec.add_records(top_level_records)
+        finally:
+            pool.terminate()
+            pool.join()
+
+        return dxf_file
+
+    def write(self, stream, encoding=None):
+        ''' Write the file to a stream as ASCII DXF, using a writer.DxfWriter. Each object is written from its parsed
+            attributes and the records it kept, so records pydxf doesn't understand are written back out.
+            encoding - Encoding of text values. By default, the one given by the drawing's header.
+        '''
+
+        if encoding is None:
+            encoding = writer.writer_encoding(self)
+        with writer.DxfWriter(stream, encoding) as dxf_writer:
+            dxf_writer.write_file(self)
+
+    def save_snapshot(self, path):
+        ''' Write the file to path in pydxf's own snapshot format, which pydxf.load_snapshot reads back far faster than
+            the DXF can be parsed. Entities are stored as columns: their numeric attributes as arrays, strings such as
+            layer names in a table of distinct strings, and their other records packed into one array of group codes
+            and one blob of values. Snapshots are specific to the pydxf version that wrote them.
+        '''
+        snapshot.save(self, path)
+
     @property
     def sections(self):
         return self._sections
 
+    @property
+    def extents(self):
+        ''' The (xmin, ymin, xmax, ymax) bounding box of the drawing, computed from its entities rather than the often
+            stale $EXTMIN and $EXTMAX header variables. None if there are no entities with known geometry.
+        '''
+
+        entities_sec = self.sections.get('ENTITIES')
+        return entities_sec.extents() if entities_sec else None
+
+    @property
+    def layer_extents(self):
+        ''' Dict of layer name to the bounding box of the layer's entities. See EntitiesSection.layer_extents.
+        '''
+
+        entities_sec = self.sections.get('ENTITIES')
+        return entities_sec.layer_extents() if entities_sec else {}
+
     @property
     def layers(self):
-        all_layers = tools.keyfaultdict(table.DxfLayer.make_default_layer)
+        ''' tools.lookupfaultdict of layer name to DxfLayer, holding every layer in the LAYER table and a default layer
+            for each other layer that entities are on. Looking up a missing layer gives a default layer without adding
+            it. The dict is built on first use and kept until layers or entities are added, or entities are changed
+            through EntitiesSection.entities_changed. Call invalidate_layers after changing layers or entity layer names
+            any other way.
+        '''
+
+        tables_sec = self.sections.get('TABLES')
+        layer_tab = tables_sec.tables.get('LAYER') if tables_sec else None
+        entities_sec = self.sections.get('ENTITIES')
+        key = (layer_tab, layer_tab.version if layer_tab else None,
+               entities_sec, entities_sec.version if entities_sec else None)
+        if self._layers is None or self._layers_key != key:
+            self._layers = self._collect_layers(layer_tab, entities_sec)
+            self._layers_key = key
+
+        return self._layers
 
-        table_sec = self.sections.get('TABLES')
-        if table_sec:
-            layer_tab = table_sec.tables.get('LAYER')
-            if layer_tab:
-                for layer in layer_tab.layers:
-                    all_layers[layer.name] = layer
+    @staticmethod
+    def _collect_layers(layer_tab, entities_sec):
+        all_layers = tools.lookupfaultdict(table.DxfLayer.make_default_layer)
+        if layer_tab:
+            for layer in layer_tab.layers:
+                all_layers[layer.name] = layer
 
         # Explicitly create default layers from the ENTITIES section so that (x in layers) works as expected
-        entities_sec = self.sections.get('ENTITIES')
         if entities_sec:
-            for entity in entities_sec.entities:
-                if entity.layer_name not in all_layers:
-                    all_layers[entity.layer_name] = table.DxfLayer.make_default_layer(entity.layer_name)
+            for layer_name in entities_sec.layer_names():
+                if layer_name not in all_layers:
+                    all_layers[layer_name] = table.DxfLayer.make_default_layer(layer_name)
 
         return all_layers
+
+    def invalidate_layers(self):
+        self._layers = None
+
+    def entities_on_layer(self, layer_name):
+        ''' List of the entities on a layer, in file order. See EntitiesSection.entities_on_layer.
+        '''
+
+        entities_sec = self.sections.get('ENTITIES')
+        return entities_sec.entities_on_layer(layer_name) if entities_sec else []
+
+
+class LazySections(collections.Mapping):
+    ''' Read-only mapping of section names to DxfSections, backed by the byte ranges of the sections in a buffer. A
+        section is parsed through the section factories the first time it is looked up, and kept from then on.
+    '''
+
+    def __init__(self, buf, index, names=None, entity_types=None, layers=None):
+        self._buf = buf
+        self._ranges = collections.OrderedDict((name, (start, end)) for name, start, end in index)
+        self._names = names
+        self._entity_types = entity_types
+        self._layers = layers
+        self._sections = {}
+        self._codepage = None
+
+    def __getitem__(self, name):
+        if name in self._sections:
+            return self._sections[name]
+
+        if name not in self:
+            raise KeyError(name)
+        start, end = self._ranges[name]
+        new_section = _make_section_from_range(self._buf, start, end, self._get_codepage(), self._entity_types,
+                                               self._layers)
+        self._sections[name] = new_section
+        return new_section
+
+    def __iter__(self):
+        return (name for name in self._ranges if name in self)
+
+    def __len__(self):
+        return sum(1 for name in self)
+
+    def __contains__(self, name):
+        # The HEADER range is always kept for its codepage, but is only visible when requested.
+        return name in self._ranges and (self._names is None or name in self._names)
+
+    def __reduce__(self):
+        # The buffer can't be pickled, so this pickles as a plain dict of the sections, loading any that aren't yet.
+        return dict, (), None, None, ((name, self[name]) for name in self)
+
+    def is_loaded(self, name):
+        return name in self._sections
+
+    def _get_codepage(self):
+        # Every section is decoded with the codepage from the HEADER section, so find that first.
+        if self._codepage is None:
+            self._codepage = tools.read_codepage(self._buf, [(name, start, end) for name, (start, end) in
+                                                             self._ranges.iteritems()])
+        return self._codepage
+
+
+def _make_section_from_range(buf, start, end, codepage, entity_types=None, layers=None):
+    records = list(tools.mmap_record_iterator(buf, start=start, end=end, codepage=codepage, entity_types=entity_types,
+                                              layers=layers))
+    if not records[-1].is_section_end():
+        # Truncated last section, handled as in make_file.
+        records.append(DxfRecord(0, 'ENDSEC'))
+
+    return section.DxfSection.make_section(records)
@@ -1,9 +1,14 @@
 import collections
-import copy
+import contextlib
+import itertools
 import pydxf
 from . import entity, table, tools
 
 
+def _no_default():
+    # Default factory for dicts that give None for missing keys. A lambda would make them impossible to pickle.
+    return None
+
 
 class DxfSection(object):
 
@@ -11,7 +16,7 @@ class DxfSection(object):
 
     def __init__(self):
         self.name = ''
-        self._records = []
+        self._records = pydxf.DxfRecordList()
 
     def add_records(self, record):
         tools.list_extend(self._records, record)
@@ -20,6 +25,22 @@ class DxfSection(object):
     def records(self):
         return self._records
 
+    def iter_records(self):
+        ''' Generate the records to write the section out with, from (0, SECTION) to (0, ENDSEC).
+        '''
+
+        return itertools.chain((pydxf.DxfRecord(0, 'SECTION'), pydxf.DxfRecord(2, self.name)),
+                               self._iter_body_records(), (pydxf.DxfRecord(0, 'ENDSEC'),))
+
+    def _iter_body_records(self):
+        # The records kept by the section, less the SECTION, name and ENDSEC records that some sections keep.
+        records = iter(self._records)
+        for rec in records:
+            if rec.code == 0 and rec.value == 'SECTION':
+                next(records, None)
+            elif not rec.is_section_end():
+                yield rec
+
     @staticmethod
     def __make_default_section(records):
         # Don't worry about checking data integrity - should already be done.
@@ -60,10 +81,216 @@ class EntitiesSection(DxfSection):
     def __init__(self):
         super(EntitiesSection, self).__init__()
         self.name = EntitiesSection.SECTION_TYPE
-        self.entities = []
+        self._entities = []
+        # Callable making the entities the first time they're needed, for sections loaded from a snapshot.
+        self._entity_loader = None
+        self._columns = {}
+        self._spatial_index = None
+        # Bounding box of each layer's entities, once computed, and the layers whose boxes need recomputing.
+        self._layer_extents = None
+        self._stale_layers = set()
+        # Layer name to the entities on it, in section order, once built, and the id of each of those entities to the
+        # layer it was indexed under.
+        self._layer_index = None
+        self._indexed_layers = None
+        # Bumped whenever entities are added or changed, so that things derived from them can tell they're stale.
+        self.version = 0
+
+    @property
+    def entities(self):
+        if self._entity_loader is not None:
+            loader, self._entity_loader = self._entity_loader, None
+            self._entities = loader()
+        return self._entities
+
+    @entities.setter
+    def entities(self, entities):
+        # Everything derived from the old entities is dropped and rebuilt on demand.
+        self._entities = entities
+        self._entity_loader = None
+        self._columns = {}
+        self._spatial_index = None
+        self._layer_extents = None
+        self._stale_layers = set()
+        self._layer_index = None
+        self._indexed_layers = None
+        self.version += 1
+
+    def defer_entities(self, loader):
+        ''' Have the entities of this empty section made by calling loader the first time they are needed.
+        '''
+        self._entity_loader = loader
 
     def add_entities(self, entity):
+        start = len(self.entities)
         tools.list_extend(self.entities, entity)
+        self.version += 1
+
+        if self._layer_index is not None:
+            for new_entity in self.entities[start:]:
+                self._layer_index[new_entity.layer_name].append(new_entity)
+                self._indexed_layers[id(new_entity)] = new_entity.layer_name
+
+        # Added entities can only grow the extents, so they are merged in directly.
+        if self._layer_extents is not None:
+            layer_extents = self._layer_extents
+            for new_entity in self.entities[start:]:
+                layer = new_entity.layer_name
+                layer_extents[layer] = tools.union_extents(layer_extents.get(layer), new_entity.extents())
+
+        if self._spatial_index is not None:
+            for new_entity in self.entities[start:]:
+                extents = new_entity.extents()
+                if extents is not None:
+                    self._spatial_index.insert(new_entity, extents)
+
+        # Keep any columns that have already been built up to date.
+        if self._columns:
+            for new_entity in self.entities[start:]:
+                for columns in self._columns.itervalues():
+                    if new_entity.name == columns.source_type:
+                        columns.append(new_entity)
+
+    def columns(self, entity_type):
+        ''' Return an entity.EntityColumns holding the geometry of every entity of the given type (LINE, ARC, CIRCLE or
+            VERTEX) in this section as arrays. The columns are built on first use and then kept up to date as entities
+            are added. Entity attributes changed directly after that are not seen; call invalidate_columns.
+            VERTEX columns hold the vertices of every POLYLINE, one row per vertex.
+        '''
+
+        columns = self._columns.get(entity_type)
+        if columns is None:
+            columns = entity.EntityColumns.for_type(entity_type)
+            columns.extend(ent for ent in self.entities if ent.name == columns.source_type)
+            columns.on_update = self.entities_changed
+            self._columns[entity_type] = columns
+
+        return columns
+
+    def entities_changed(self, entities):
+        ''' Tell the section that the geometry or layer of some of its entities was modified in place, so that the
+            spatial index, layer index and extents can be brought up to date. Helpers in tools, and
+            EntityColumns.update, call this themselves.
+        '''
+
+        self.version += 1
+
+        # Entities moved to another layer are found by the layer they were indexed under. The index is then rebuilt,
+        # and the extents of the layers they left are recomputed along with those of the layers they're on now.
+        if self._layer_index is not None:
+            indexed_layers = self._indexed_layers
+            old_layers = set(indexed_layers.get(id(changed)) for changed in entities
+                             if indexed_layers.get(id(changed)) != changed.layer_name)
+            if old_layers:
+                self._layer_index = None
+                if self._layer_extents is not None:
+                    if None in old_layers:
+                        # Not added through add_entities, so where it was before is unknown.
+                        self._layer_extents = None
+                    else:
+                        self._stale_layers.update(old_layers)
+                        self._get_layer_index()
+
+        if self._spatial_index is not None:
+            for changed in entities:
+                self._spatial_index.update(changed, changed.extents())
+
+        # Modified entities may have shrunk their layer's extents, so only those layers are recomputed.
+        if self._layer_extents is not None:
+            self._stale_layers.update(changed.layer_name for changed in entities)
+
+    def layer_extents(self):
+        ''' Return a dict of layer name to the (xmin, ymin, xmax, ymax) bounding box of the layer's entities, covering
+            entities with known geometry (see DxfEntity.extents). Layers without any are left out. The boxes are
+            computed once and then kept up to date as entities are added or changed through entities_changed.
+        '''
+
+        if self._layer_extents is None:
+            self._layer_extents = self._compute_layer_extents(self.entities)
+            self._stale_layers.clear()
+            # Needed by entities_changed to tell which layers entities have moved off of.
+            self._get_layer_index()
+        elif self._stale_layers:
+            stale = self._stale_layers
+            for layer in stale:
+                self._layer_extents.pop(layer, None)
+            self._layer_extents.update(
+                self._compute_layer_extents(ent for ent in self.entities if ent.layer_name in stale))
+            self._stale_layers = set()
+
+        return dict((layer, extents) for layer, extents in self._layer_extents.iteritems() if extents is not None)
+
+    def entities_on_layer(self, layer_name):
+        ''' Return a list of the entities on the given layer, in section order. Looked up in an index of layer name to
+            entities that is built on first use and kept up to date as entities are added.
+        '''
+        return list(self._get_layer_index().get(layer_name, ()))
+
+    def layer_names(self):
+        ''' Return a list of the names of the layers that entities in this section are on.
+        '''
+        return self._get_layer_index().keys()
+
+    def _get_layer_index(self):
+        if self._layer_index is None:
+            index = collections.defaultdict(list)
+            indexed_layers = {}
+            for ent in self.entities:
+                index[ent.layer_name].append(ent)
+                indexed_layers[id(ent)] = ent.layer_name
+            self._layer_index = index
+            self._indexed_layers = indexed_layers
+        return self._layer_index
+
+    def extents(self):
+        ''' Return the (xmin, ymin, xmax, ymax) bounding box of all entities with known geometry, or None.
+        '''
+        return reduce(tools.union_extents, self.layer_extents().itervalues(), None)
+
+    @staticmethod
+    def _compute_layer_extents(entities):
+        layer_extents = {}
+        union = tools.union_extents
+        for ent in entities:
+            extents = ent.extents()
+            if extents is not None:
+                layer = ent.layer_name
+                layer_extents[layer] = union(layer_extents.get(layer), extents)
+        return layer_extents
+
+    def query_bbox(self, xmin, ymin, xmax, ymax):
+        ''' Return the entities, in section order, whose extents intersect the given rectangle. Only entities with
+            known geometry (see DxfEntity.extents) are found. A spatial grid over the entities is built on the first
+            query and kept up to date as entities are added.
+        '''
+
+        if self._spatial_index is None:
+            all_extents = [(ent, ent.extents()) for ent in self.entities]
+            index = tools.spatial_grid.for_extents(extents for ent, extents in all_extents)
+            for ent, extents in all_extents:
+                if extents is not None:
+                    index.insert(ent, extents)
+            self._spatial_index = index
+
+        return self._spatial_index.query(xmin, ymin, xmax, ymax)
+
+    def invalidate_columns(self, entity_type=None):
+        if entity_type is None:
+            self._columns.clear()
+        else:
+            self._columns.pop(entity_type, None)
+
+    def _iter_body_records(self):
+        return itertools.chain(super(EntitiesSection, self)._iter_body_records(),
+                               itertools.chain.from_iterable(ent.iter_records() for ent in self.entities))
+
+    def __getstate__(self):
+        # The columns, spatial index, extents and layer index are derived from the entities, and are rebuilt on demand
+        # after unpickling. The columns also hold a bound method, and the spatial index is keyed by object ids.
+        state = self.__dict__.copy()
+        state.update(_entities=self.entities, _entity_loader=None, _columns={}, _spatial_index=None,
+                     _layer_extents=None, _stale_layers=set(), _layer_index=None, _indexed_layers=None)
+        return state
 
     def __len__(self):
         return len(self.entities)
@@ -78,14 +305,91 @@ class EntitiesSection(DxfSection):
     def make_section(records):
         section = EntitiesSection()
 
-        block_iter = tools.record_block_iterator(records[2:], pydxf.DxfRecord(0, None), pydxf.DxfRecord(0, None))
-        for entity_records in block_iter:
-            section.add_entities(entity.DxfEntity.make_entity(entity_records))
-
-        section.add_records(block_iter.get_top_level_records())
+        entities, top_level_records = EntitiesSection._parse_entities(records, 2)
+        section.add_entities(entities)
+        section.add_records(top_level_records)
 
         return section
 
+    @staticmethod
+    def _parse_entities(records, start=0):
+        # Parse records[start:], the body of an ENTITIES section or a range of it starting at an entity, into a list of
+        # entities and a list of the records that weren't part of any entity.
+        block_iter = tools.record_blocks(records, pydxf.DxfRecord(0, None), pydxf.DxfRecord(0, None), start=start)
+        entities = list(EntitiesSection._assemble_entities(block_iter))
+        return entities, block_iter.get_top_level_records()
+
+    @staticmethod
+    def _assemble_entities(blocks):
+        # Generate entities from blocks of entity records. The VERTEX and SEQEND blocks following a POLYLINE are parsed
+        # straight into that polyline rather than becoming entities of their own.
+        make_entity = entity.DxfEntity.make_entity
+        polyline = None
+
+        for records in blocks:
+            if polyline is not None:
+                entity_type = records[0].value
+                if entity_type == entity.VertexEntity.ENTITY_TYPE:
+                    polyline.vertices.add_records(records)
+                    continue
+
+                if entity_type == entity.SeqEndEntity.ENTITY_TYPE:
+                    polyline.seqend = make_entity(records)
+                    yield polyline
+                    polyline = None
+                    continue
+
+                # A polyline without a SEQEND. Keep whatever vertices it got.
+                yield polyline
+                polyline = None
+
+            new_entity = make_entity(records)
+            if new_entity.name == entity.PolyLineEntity.ENTITY_TYPE:
+                polyline = new_entity
+            else:
+                yield new_entity
+
+        if polyline is not None:
+            yield polyline
+
+    @staticmethod
+    def iter_entities(records):
+        ''' Generate DxfEntities one at a time from the ENTITIES section found in an iterable of all of a file's
+            DxfRecords. Only the records of the entity currently being assembled are held, and the records following
+            the section are never read.
+        '''
+
+        records = iter(records)
+        for rec in records:
+            if rec.code == 0 and rec.value == 'SECTION':
+                name = next(records, None)
+                if name is not None and name.code == 2 and name.value == EntitiesSection.SECTION_TYPE:
+                    break
+        else:
+            return
+
+        for new_entity in EntitiesSection._assemble_entities(EntitiesSection._iter_entity_blocks(records)):
+            yield new_entity
+
+    @staticmethod
+    def _iter_entity_blocks(records):
+        # Group the records of an ENTITIES section into one list per entity, stopping at the section end.
+        entity_records = []
+        for rec in records:
+            if rec.code == 0:
+                if entity_records:
+                    yield entity_records
+                    entity_records = []
+                if rec.value == 'ENDSEC':
+                    return
+                entity_records.append(rec)
+            elif entity_records:
+                entity_records.append(rec)
+
+        # Truncated file with no ENDSEC.
+        if entity_records:
+            yield entity_records
+
 
 class HeaderSection(DxfSection):
 
@@ -94,7 +398,7 @@ class HeaderSection(DxfSection):
     def __init__(self):
         super(HeaderSection, self).__init__()
         self.name = HeaderSection.SECTION_TYPE
-        self.variables = collections.defaultdict(lambda: None)
+        self.variables = HeaderVariables()
 
     def __len__(self):
         return len(self.variables)
@@ -121,35 +425,164 @@ class HeaderSection(DxfSection):
     def make_section(records):
         section = HeaderSection()
 
-        block_iter = tools.record_block_iterator(
+        # The variables are only located here. Their values are decoded when they're first read.
+        records = pydxf.DxfRecordList(records)
+        block_iter = tools.record_blocks(
             records, pydxf.DxfRecord(9, None), [pydxf.DxfRecord(9, None), pydxf.DxfRecord(0, 'ENDSEC')])
 
-        for variable_records in block_iter:
-            section._add_variable(*HeaderSection._make_variable(variable_records))
+        section.variables = HeaderVariables(records)
+        for start, end in block_iter.ranges:
+            section.variables.add_range(records[start].value.lstrip('$'), start + 1, end)
 
         section.add_records(block_iter.get_top_level_records())
 
         return section
 
-    def _add_variable(self, name, value):
-        self.variables[name] = value
+    def _iter_body_records(self):
+        for rec in super(HeaderSection, self)._iter_body_records():
+            yield rec
+
+        # Variables in file order, then any added since.
+        for name in self.variables:
+            yield pydxf.DxfRecord(9, '$' + name)
+            for rec in self.variables.value_records(name):
+                yield rec
+
+
+class HeaderVariables(collections.MutableMapping):
+    ''' Mapping of header variable names, without the $, to their values, for HeaderSection.variables. Each variable
+        is kept as the range of its records in the section until it is first read, when it is decoded by group code
+        and remembered. Numbers are converted to ints and floats, and points such as $EXTMIN to tuples of floats.
+        Text stays as it was read. Other variables made of several records are lists of their DxfRecords.
+        Missing variables read as None. Variables that are never assigned are written back out as they were read.
+    '''
+
+    def __init__(self, records=None):
+        # All of the section's records, which the ranges index into.
+        self._records = records if records is not None else pydxf.DxfRecordList()
+        # Variable names, in file order and then the order they were added.
+        self._names = collections.OrderedDict()
+        # (start, end) range in records of the value of each variable that hasn't been assigned.
+        self._ranges = {}
+        self._values = {}
+        # Group codes a variable was read with, kept when it is assigned so the new value is written with them.
+        self._codes = {}
+
+    def add_range(self, name, start, end):
+        ''' Add a variable whose value is records[start:end], to be decoded when it's first read.
+        '''
+
+        self._names[name] = None
+        self._ranges[name] = (start, end)
+        self._values.pop(name, None)
+
+    def value_records(self, name):
+        ''' Return the records to write a variable's value with, after its (9, $name) record.
+        '''
+
+        span = self._ranges.get(name)
+        if span is not None:
+            return self._records[span[0]:span[1]]
+
+        value = self._values.get(name)
+        if isinstance(value, list):
+            return value
+
+        codes = self._codes.get(name, ())
+        if isinstance(value, tuple):
+            if len(codes) != len(value):
+                codes = (10, 20, 30)[:len(value)]
+            return [pydxf.DxfRecord(code, coordinate) for code, coordinate in itertools.izip(codes, value)]
+
+        if len(codes) == 1:
+            code = codes[0]
+        else:
+            code = 70 if isinstance(value, (int, long)) else 40 if isinstance(value, float) else 1
+        return [pydxf.DxfRecord(code, value)]
+
+    def get(self, name, default=None):
+        return self[name] if name in self._names else default
+
+    def __getitem__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+
+        span = self._ranges.get(name)
+        if span is None:
+            return None
+        value = self._values[name] = HeaderVariables._decode(self._records, *span)
+        return value
+
+    def __setitem__(self, name, value):
+        span = self._ranges.pop(name, None)
+        if span is not None:
+            self._codes[name] = tuple(self._records.codes[span[0]:span[1]])
+        self._names[name] = None
+        self._values[name] = value
+
+    def __delitem__(self, name):
+        del self._names[name]
+        self._ranges.pop(name, None)
+        self._values.pop(name, None)
+        self._codes.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
 
     @staticmethod
-    def _make_variable(records):
-        # Not doing data validation. Caller should make sure data is valid.
-        var_name = records[0].value.lstrip('$')
-        var_val = records[1].value if len(records) == 2 else copy.deepcopy(records[1:])
-        return var_name, var_val
+    def _decode(records, start, end):
+        codes = records.codes[start:end]
+        if len(codes) == 1:
+            return _typed_value(codes[0], records[start].value)
+
+        # Points are coordinates with codes 10 apart, such as 10, 20 and 30.
+        if codes and _value_types[codes[0]] == 'float' and \
+                all(code == codes[0] + 10 * i for i, code in enumerate(codes)):
+            values = [records[index].value for index in xrange(start, end)]
+            try:
+                return tuple(float(value) for value in values)
+            except ValueError:
+                pass
+
+        return list(records[start:end])
+
+
+# Type of value held by each group code, from tools.group_code_type.
+_value_types = tools.keyfaultdict(tools.group_code_type)
+
+
+def _typed_value(code, value):
+    # Convert a header value to the type its group code holds. Malformed numbers are left as they are.
+    value_type = _value_types[code]
+    try:
+        if value_type == 'float':
+            return float(value)
+        if value_type in ('int16', 'int32', 'int64', 'bool'):
+            return int(value)
+    except ValueError:
+        pass
+    return value
 
 
 class TablesSection(DxfSection):
 
     SECTION_TYPE = 'TABLES'
 
+    # The order tables are written in.
+    TABLE_ORDER = ('VPORT', 'LTYPE', 'LAYER', 'STYLE', 'VIEW', 'UCS', 'APPID', 'DIMSTYLE', 'BLOCK_RECORD')
+
     def __init__(self):
         super(TablesSection, self).__init__()
         self.name = TablesSection.SECTION_TYPE
-        self.tables = collections.defaultdict(lambda: None)
+        self.tables = collections.defaultdict(_no_default)
 
     def __len__(self):
         return len(self.tables)
@@ -175,11 +608,21 @@ class TablesSection(DxfSection):
     def add_table(self, table):
         self.tables[table.name] = table
 
+    def _iter_body_records(self):
+        for rec in super(TablesSection, self)._iter_body_records():
+            yield rec
+        order = dict((name, index) for index, name in enumerate(TablesSection.TABLE_ORDER))
+        for name in sorted(self.tables, key=lambda name: (order.get(name, len(order)), name)):
+            dxf_table = self.tables[name]
+            if dxf_table is not None:
+                for rec in dxf_table.iter_records():
+                    yield rec
+
     @staticmethod
     def make_section(records):
         section = TablesSection()
 
-        block_iter = tools.record_block_iterator(
+        block_iter = tools.record_blocks(
             records, pydxf.DxfRecord(0, 'TABLE'), pydxf.DxfRecord(0, 'ENDTAB'), True)
 
         for table_records in block_iter:
@@ -188,3 +631,26 @@ class TablesSection(DxfSection):
         section.add_records(block_iter.get_top_level_records())
 
         return section
+
+
+def parse_entities_range(file_path, start, end, encoding, entity_types=None, layers=None):
+    ''' Parse the entities in buf[start:end] of the ASCII DXF file at file_path, where the range is one produced by
+        tools.split_entity_ranges. Returns a list of the entities and a list of any records outside of them. This is the
+        worker of pydxf.DxfFile.make_parallel_file, so it maps the file itself and takes the encoding by name.
+        entity_types, layers - Only parse the entities of these types and on these layers.
+    '''
+
+    with open(file_path, 'rb') as fi:
+        buf = tools.map_file(fi)
+
+    with contextlib.closing(buf):
+        codepage = tools.dxf_codepage()
+        codepage.encoding = encoding
+        codepage.settled = True
+        records = list(tools.mmap_record_iterator(buf, start=start, end=end, codepage=codepage,
+                                                  entity_types=entity_types, layers=layers, in_entities=True))
+
+    # Only the last range reaches the ENDSEC, which is what closes the final entity.
+    if not records or not records[-1].is_section_end():
+        records.append(pydxf.DxfRecord(0, 'ENDSEC'))
+    return EntitiesSection._parse_entities(records)
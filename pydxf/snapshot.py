@@ -0,0 +1,343 @@
+import array
+import contextlib
+import cPickle
+import itertools
+import struct
+import sys
+import pydxf
+from . import entity, section, tools
+
+
+# Snapshots start with this line, where the number is the format version.
+SNAPSHOT_MAGIC = b'PYDXF-SNAPSHOT 1\n'
+
+# Array data is aligned to this many bytes in the file.
+ALIGNMENT = 8
+
+# Kinds of value in a packed record store.
+STR_VALUE = 0
+UNICODE_VALUE = 1
+PICKLED_VALUE = 2
+
+
+class array_writer(object):
+    ''' Collects the arrays of a snapshot. add returns the number the array is stored under, and write writes them all
+        out, each aligned to ALIGNMENT bytes. Returns the list of (typecode, offset, length) of the arrays.
+    '''
+
+    def __init__(self):
+        self.arrays = []
+
+    def add(self, values):
+        self.arrays.append(values)
+        return len(self.arrays) - 1
+
+    def write(self, stream):
+        layout = []
+        offset = 0
+        for values in self.arrays:
+            data = values.tostring()
+            padding = -offset % ALIGNMENT
+            stream.write(b'\0' * padding)
+            stream.write(data)
+            layout.append((values.typecode, offset + padding, len(values)))
+            offset += padding + len(data)
+        return layout
+
+
+class string_table(object):
+    ''' Interns strings, storing each distinct one once and referring to it by index.
+    '''
+
+    def __init__(self):
+        self.strings = []
+        self._ids = {}
+
+    def index(self, value):
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = self._ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+
+class record_store(object):
+    ''' Packs the records of many DxfRecordLists into one array of codes and a couple of blobs of values.
+    '''
+
+    def __init__(self):
+        self.codes = array.array('h')
+        self.values = []
+
+    def add_lists(self, record_lists):
+        # Returns an array of the start offset of each list in the store, plus the end of the last one.
+        starts = array.array('i', [len(self.codes)])
+        for records in record_lists:
+            self.codes.extend(records.codes)
+            self.values.extend(records.values)
+            starts.append(len(self.codes))
+        return starts
+
+    def pack(self, arrays):
+        # Text values go in one blob, decoded in one go on loading, and byte strings and pickled values in another.
+        kinds = array.array('b')
+        byte_ends = array.array('i')
+        text_ends = array.array('i')
+        byte_chunks = []
+        text_chunks = []
+        byte_end = text_end = 0
+        for value in self.values:
+            if isinstance(value, unicode):
+                kinds.append(UNICODE_VALUE)
+                text_chunks.append(value)
+                text_end += len(value)
+                text_ends.append(text_end)
+                continue
+
+            if isinstance(value, str):
+                kinds.append(STR_VALUE)
+            else:
+                kinds.append(PICKLED_VALUE)
+                value = cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+            byte_chunks.append(value)
+            byte_end += len(value)
+            byte_ends.append(byte_end)
+
+        return {
+            'codes': arrays.add(self.codes),
+            'kinds': arrays.add(kinds),
+            'byte_ends': arrays.add(byte_ends),
+            'bytes': arrays.add(array.array('c', b''.join(byte_chunks))),
+            'text_ends': arrays.add(text_ends),
+            'text': arrays.add(array.array('c', u''.join(text_chunks).encode('utf-8'))),
+        }
+
+    @staticmethod
+    def unpack(packed, arrays):
+        # Returns the codes array and the list of values.
+        byte_values = _split(arrays[packed['bytes']].tostring(), arrays[packed['byte_ends']])
+        text_values = _split(arrays[packed['text']].tostring().decode('utf-8'), arrays[packed['text_ends']])
+
+        kinds = arrays[packed['kinds']]
+        next_bytes = iter(byte_values).next
+        next_text = iter(text_values).next
+        values = [next_text() if kind == UNICODE_VALUE else next_bytes() for kind in kinds]
+
+        if PICKLED_VALUE in kinds:
+            for index, kind in enumerate(kinds):
+                if kind == PICKLED_VALUE:
+                    values[index] = cPickle.loads(values[index])
+        return arrays[packed['codes']], values
+
+
+def _split(data, ends):
+    return [data[start:end] for start, end in itertools.izip(itertools.chain((0,), ends), ends)]
+
+
+def save(dxf_file, path):
+    ''' Write a DxfFile to a snapshot file at path. See pydxf.DxfFile.save_snapshot.
+    '''
+
+    arrays = array_writer()
+    strings = string_table()
+    records = record_store()
+
+    sections = []
+    for name, dxf_section in dxf_file.sections.iteritems():
+        if isinstance(dxf_section, section.EntitiesSection):
+            sections.append((name, None, {
+                'records': dxf_section.records,
+                'entities': _pack_entities(dxf_section.entities, arrays, strings, records),
+            }))
+        else:
+            sections.append((name, dxf_section, None))
+
+    manifest = {
+        'byteorder': sys.byteorder,
+        'sections': sections,
+        'strings': strings.strings,
+        'records': records.pack(arrays),
+    }
+
+    with open(path, 'wb') as fo:
+        data = cPickle.dumps(manifest, cPickle.HIGHEST_PROTOCOL)
+        fo.write(SNAPSHOT_MAGIC)
+        fo.write(struct.pack('<Q', len(data)))
+        fo.write(data)
+        fo.write(b'\0' * (-fo.tell() % ALIGNMENT))
+        layout_offset = fo.tell()
+        layout = cPickle.dumps(arrays.write(fo), cPickle.HIGHEST_PROTOCOL)
+        # The array layout is only known once the arrays are written, so it goes at the end.
+        fo.write(layout)
+        fo.write(struct.pack('<QQ', layout_offset, len(layout)))
+
+
+def load(path):
+    ''' Read a DxfFile from a snapshot file written by save. See pydxf.load_snapshot.
+    '''
+
+    with open(path, 'rb') as fi:
+        buf = tools.map_file(fi)
+
+    with contextlib.closing(buf):
+        if buf[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise pydxf.FormatException('File is not a pydxf snapshot, or is from another version of pydxf')
+
+        position = len(SNAPSHOT_MAGIC)
+        manifest_size, = struct.unpack('<Q', buf[position:position + 8])
+        manifest = cPickle.loads(buf[position + 8:position + 8 + manifest_size])
+        data_start, layout_size = struct.unpack('<QQ', buf[-16:])
+        layout = cPickle.loads(buf[len(buf) - 16 - layout_size:len(buf) - 16])
+
+        # Copying the arrays out of the map is as fast as reading them from it in place, and lets it be closed.
+        arrays = []
+        for typecode, offset, length in layout:
+            values = array.array(typecode)
+            start = data_start + offset
+            values.fromstring(buf[start:start + length * values.itemsize])
+            arrays.append(values)
+
+    if manifest['byteorder'] != sys.byteorder:
+        for values in arrays:
+            values.byteswap()
+
+    # The record values are shared by every entity, so they're unpacked once, along with the first entities.
+    unpacked_records = []
+
+    def entity_loader(packed):
+        def load_entities():
+            if not unpacked_records:
+                unpacked_records.append(record_store.unpack(manifest['records'], arrays))
+            codes, values = unpacked_records[0]
+            return _unpack_entities(packed, arrays, manifest['strings'], codes, values)
+        return load_entities
+
+    dxf_file = pydxf.DxfFile()
+    for name, dxf_section, entities in manifest['sections']:
+        if entities is not None:
+            dxf_section = section.EntitiesSection()
+            dxf_section.name = name
+            dxf_section.add_records(entities['records'])
+            dxf_section.defer_entities(entity_loader(entities['entities']))
+        dxf_file.sections[name] = dxf_section
+
+    return dxf_file
+
+
+def _pack_entities(entities, arrays, strings, records):
+    # Entities are grouped by class and attribute names, and each group stores each of its attributes as a column.
+    group_ids = {}
+    group_entities = []
+    group_index = array.array('i')
+    for ent in entities:
+        key = (type(ent), tuple(sorted(ent.__dict__)))
+        group_id = group_ids.get(key)
+        if group_id is None:
+            group_id = group_ids[key] = len(group_entities)
+            group_entities.append([])
+        group_entities[group_id].append(ent)
+        group_index.append(group_id)
+
+    groups = [None] * len(group_ids)
+    for (cls, names), group_id in group_ids.iteritems():
+        groups[group_id] = _pack_group(cls, names, group_entities[group_id], arrays, strings, records)
+
+    return {'group_index': arrays.add(group_index), 'groups': groups}
+
+
+def _pack_group(cls, names, entities, arrays, strings, records):
+    columns = []
+    for name in names:
+        values = [ent.__dict__[name] for ent in entities]
+        if all(type(value) is float for value in values):
+            columns.append((name, 'numbers', arrays.add(array.array('d', values))))
+        elif all(type(value) is int for value in values):
+            columns.append((name, 'numbers', arrays.add(array.array('l', values))))
+        elif all(isinstance(value, basestring) for value in values):
+            columns.append((name, 'strings', arrays.add(array.array('i', [strings.index(value) for value in values]))))
+        elif all(isinstance(value, pydxf.DxfRecordList) for value in values):
+            columns.append((name, 'records', arrays.add(records.add_lists(values))))
+        elif all(isinstance(value, entity.VertexBuffer) for value in values):
+            columns.append((name, 'vertices', _pack_vertices(values, arrays, records)))
+        elif all(value is None or isinstance(value, entity.DxfEntity) for value in values):
+            # Such as the SEQEND of a polyline. These are packed like the section's entities.
+            present = array.array('i', (index for index, value in enumerate(values) if value is not None))
+            nested = _pack_entities([values[index] for index in present], arrays, strings, records)
+            columns.append((name, 'entities', (arrays.add(present), nested)))
+        else:
+            columns.append((name, 'objects', values))
+
+    return {'class': cls, 'count': len(entities), 'columns': columns}
+
+
+def _pack_vertices(buffers, arrays, records):
+    starts = array.array('i', [0])
+    columns = dict((name, array.array('d')) for name in entity.VertexEntity.COLUMNS)
+    record_starts = array.array('i')
+    for vertices in buffers:
+        for name, column in columns.iteritems():
+            column.extend(getattr(vertices, name))
+        record_starts.extend(vertices._record_starts)
+        starts.append(starts[-1] + len(vertices))
+
+    packed = dict((name, arrays.add(column)) for name, column in columns.iteritems())
+    packed.update(starts=arrays.add(starts), record_starts=arrays.add(record_starts),
+                  records=arrays.add(records.add_lists(vertices._records for vertices in buffers)))
+    return packed
+
+
+def _unpack_entities(packed, arrays, strings, codes, values):
+    groups = [iter(_unpack_group(group, arrays, strings, codes, values)).next for group in packed['groups']]
+    return [groups[group_id]() for group_id in arrays[packed['group_index']]]
+
+
+def _unpack_group(group, arrays, strings, codes, values):
+    cls = group['class']
+    count = group['count']
+    names = []
+    columns = []
+
+    for name, kind, data in group['columns']:
+        if kind == 'numbers':
+            column = arrays[data].tolist()
+        elif kind == 'strings':
+            column = [strings[index] for index in arrays[data]]
+        elif kind == 'records':
+            starts = arrays[data]
+            column = [pydxf.DxfRecordList.from_columns(codes[start:end], values[start:end])
+                      for start, end in itertools.izip(starts, starts[1:])]
+        elif kind == 'vertices':
+            column = _unpack_vertices(data, arrays, codes, values)
+        elif kind == 'entities':
+            present, nested = data
+            column = [None] * count
+            for index, ent in itertools.izip(arrays[present], _unpack_entities(nested, arrays, strings, codes, values)):
+                column[index] = ent
+        else:
+            column = data
+        names.append(name)
+        columns.append(column)
+
+    # Entities are made without calling __init__, so all of their attributes come from the columns.
+    new = cls.__new__
+    entities = [new(cls) for i in xrange(count)]
+    for ent, row in itertools.izip(entities, itertools.izip(*columns)):
+        ent.__dict__.update(itertools.izip(names, row))
+    return entities
+
+
+def _unpack_vertices(packed, arrays, codes, values):
+    starts = arrays[packed['starts']]
+    record_starts = arrays[packed['record_starts']]
+    records = arrays[packed['records']]
+    x, y, z, bulge = [arrays[packed[name]] for name in ('x', 'y', 'z', 'bulge')]
+
+    buffers = []
+    for index, (start, end) in enumerate(itertools.izip(starts, starts[1:])):
+        # Each buffer's record_starts has one more entry than it has vertices.
+        buffers.append(entity.VertexBuffer.from_columns(
+            x[start:end], y[start:end], z[start:end], bulge[start:end],
+            pydxf.DxfRecordList.from_columns(codes[records[index]:records[index + 1]],
+                                             values[records[index]:records[index + 1]]),
+            record_starts[start + index:end + index + 1]))
+    return buffers
@@ -10,7 +10,7 @@ class DxfTable(object):
 
     def __init__(self):
         self.name = ''
-        self._records = []
+        self._records = pydxf.DxfRecordList()
 
     def add_records(self, record):
         tools.list_extend(self._records, record)
@@ -19,6 +19,25 @@ class DxfTable(object):
     def records(self):
         return self._records
 
+    def iter_records(self):
+        ''' Generate the records to write the table out with, from (0, TABLE) to (0, ENDTAB).
+        '''
+
+        yield pydxf.DxfRecord(0, 'TABLE')
+        # Tables made by the default factory keep their name record, but LayerTable keeps its TABLE record as well.
+        records = [rec for rec in self._records if not (rec.code == 0 and rec.value == 'TABLE')]
+        if not records or records[0].code != 2:
+            yield pydxf.DxfRecord(2, self.name)
+        for rec in records:
+            yield rec
+        for rec in self._iter_entry_records():
+            yield rec
+        yield pydxf.DxfRecord(0, 'ENDTAB')
+
+    def _iter_entry_records(self):
+        # Records of the table's entries, for tables that parse them.
+        return iter(())
+
     @staticmethod
     def __make_default_table(records):
         table = DxfTable()
@@ -59,19 +78,27 @@ class LayerTable(DxfTable):
         super(LayerTable, self).__init__()
         self.name = LayerTable.TABLE_TYPE
         self._layers = []
+        # Bumped whenever layers are added, so that DxfFile.layers knows to rebuild.
+        self.version = 0
 
     def add_layers(self, layer):
         tools.list_extend(self._layers, layer)
+        self.version += 1
 
     @property
     def layers(self):
         return self._layers
 
+    def _iter_entry_records(self):
+        for layer in self._layers:
+            for rec in layer.iter_records():
+                yield rec
+
     @staticmethod
     def make_table(records):
         table = LayerTable()
 
-        block_iter = tools.record_block_iterator(records, pydxf.DxfRecord(0, 'LAYER'), pydxf.DxfRecord(0, None))
+        block_iter = tools.record_blocks(records, pydxf.DxfRecord(0, 'LAYER'), pydxf.DxfRecord(0, None))
         for layer_records in block_iter:
             table.add_layers(DxfLayer.make_layer(layer_records))
 
@@ -85,6 +112,25 @@ class DxfLayer(object):
     def __init__(self):
         self.name = ''
         self.color_index = None
+        self._records = pydxf.DxfRecordList()
+
+    def add_records(self, record):
+        tools.list_extend(self._records, record)
+
+    @property
+    def records(self):
+        return self._records
+
+    def iter_records(self):
+        ''' Generate the records to write the layer out with, as for entities.
+        '''
+
+        yield pydxf.DxfRecord(0, 'LAYER')
+        fields = [pydxf.DxfRecord(2, self.name)]
+        if self.color_index is not None:
+            fields.append(pydxf.DxfRecord(62, self.color_index))
+        for rec in tools.layout_records(self._records, fields=fields):
+            yield rec
 
     @staticmethod
     def make_layer(records):
@@ -92,11 +138,13 @@ class DxfLayer(object):
         '''
         layer = DxfLayer()
 
-        for record in records:
+        for record in records[1:]:
             if record.code == 2:
                 layer.name = record.value
             elif record.code == 62:
                 layer.color_index = int(record.value)
+            else:
+                layer.add_records(record)
 
         return layer
 
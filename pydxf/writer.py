@@ -0,0 +1,156 @@
+import codecs
+import pydxf
+from . import tools
+
+
+# The order sections are written in by write_file. Any others follow in name order.
+SECTION_ORDER = ('HEADER', 'CLASSES', 'TABLES', 'BLOCKS', 'ENTITIES', 'OBJECTS', 'THUMBNAILIMAGE')
+
+# Size of the chunks the writer writes to its stream.
+WRITE_BUFFER_SIZE = 1 << 16
+
+
+def _escape_unencodable(error):
+    # Characters the file's codepage can't hold are written as DXF \U+XXXX escapes.
+    return u''.join(u'\\U+%04X' % ord(char) for char in error.object[error.start:error.end]), error.end
+
+codecs.register_error('pydxf-unicode-escape', _escape_unencodable)
+
+
+class DxfWriter(object):
+    ''' Writes ASCII DXF to a stream, one record, entity or section at a time. Output is collected into chunks of about
+        buffer_size bytes and written with one call each, so nothing more than a chunk and the object being written is
+        held in memory. Use as a context manager, or call close to write the final EOF record and flush the buffer.
+
+            with DxfWriter(stream) as writer:
+                writer.write_section(dxf_file.sections['HEADER'])
+                writer.begin_section('ENTITIES')
+                for entity in pydxf.iter_entities(path):
+                    writer.write_entity(entity)
+                writer.end_section()
+
+        encoding - Encoding of text values. Use writer_encoding to get the one matching a drawing's header.
+    '''
+
+    def __init__(self, stream, encoding='utf-8', buffer_size=WRITE_BUFFER_SIZE):
+        self.stream = stream
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+        self._chunks = []
+        self._buffered = 0
+        self._code_lines = dict((code, '%3d\n' % code) for code in xrange(1072))
+        self._closed = False
+
+    def write_record(self, code, value):
+        self.write_records((pydxf.DxfRecord(code, value),))
+
+    def write_records(self, records):
+        ''' Write an iterable of DxfRecords.
+        '''
+
+        code_lines = self._code_lines
+        encoding = self.encoding
+        append = self._chunks.append
+        buffer_size = self.buffer_size
+        buffered = self._buffered
+
+        for rec in records:
+            value = rec.value
+            value_type = type(value)
+            if value_type is str:
+                pass
+            elif value_type is float:
+                # repr gives the shortest string that reads back as the same float.
+                value = repr(value)
+            elif value_type is unicode:
+                value = value.encode(encoding, 'pydxf-unicode-escape')
+            else:
+                value = str(value)
+
+            line = code_lines.get(rec.code)
+            if line is None:
+                line = '%3d\n' % rec.code
+            append(line)
+            append(value)
+            append('\n')
+
+            buffered += len(value) + 5
+            if buffered >= buffer_size:
+                self._write_chunks()
+                append = self._chunks.append
+                buffered = 0
+
+        self._buffered = buffered
+
+    def begin_section(self, name):
+        self.write_records((pydxf.DxfRecord(0, 'SECTION'), pydxf.DxfRecord(2, name)))
+
+    def end_section(self):
+        self.write_record(0, 'ENDSEC')
+
+    def write_section(self, section):
+        self.write_records(section.iter_records())
+
+    def write_entity(self, entity):
+        self.write_records(entity.iter_records())
+
+    def write_entities(self, entities):
+        for entity in entities:
+            self.write_records(entity.iter_records())
+
+    def write_file(self, dxf_file):
+        ''' Write every section of a DxfFile, in the usual section order.
+        '''
+
+        sections = dxf_file.sections
+        order = dict((name, index) for index, name in enumerate(SECTION_ORDER))
+        for name in sorted(sections, key=lambda name: (order.get(name, len(order)), name)):
+            self.write_section(sections[name])
+
+    def flush(self):
+        self._write_chunks()
+        if hasattr(self.stream, 'flush'):
+            self.stream.flush()
+
+    def close(self):
+        ''' Write the EOF record and flush everything to the stream. The stream itself is left open.
+        '''
+
+        if not self._closed:
+            self._closed = True
+            self.write_record(0, 'EOF')
+            self.flush()
+
+    def _write_chunks(self):
+        if self._chunks:
+            self.stream.write(''.join(self._chunks))
+            self._chunks = []
+        self._buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.flush()
+
+
+def writer_encoding(dxf_file):
+    ''' Return the encoding to write a drawing's text in, following the same header variables that are read to decode
+        it: UTF-8 from AutoCAD 2007 (AC1021) on, and $DWGCODEPAGE before that.
+    '''
+
+    header = dxf_file.sections.get('HEADER')
+    if header is None:
+        return tools.CODEPAGES['ANSI_1252']
+
+    version = header.variables.get('ACADVER')
+    if isinstance(version, basestring) and version >= 'AC1021':
+        return 'utf-8'
+
+    codepage = header.variables.get('DWGCODEPAGE')
+    if isinstance(codepage, basestring):
+        return tools.CODEPAGES.get(codepage.upper(), tools.CODEPAGES['ANSI_1252'])
+    return tools.CODEPAGES['ANSI_1252']
@@ -10,6 +10,9 @@ setup(
     description='DXF parsing library for python',
     packages=['pydxf'],
     install_requires=[],
+    entry_points={
+        'console_scripts': ['pydxf-summary = pydxf.cli:main'],
+    },
     classifiers=[
         "Development Status :: 2 - Pre-Alpha",
         "Programming Language :: Python :: 2",
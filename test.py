@@ -1,11 +1,27 @@
+import array
 import decimal
 import itertools
+import json
 import pydxf
+import pydxf.cache
+import pydxf.cli
+import pydxf.writer
 from pydxf.pydxf import DxfRecord
 import pydxf.tools
+import os
+import pickle
+import shutil
 import StringIO
+import struct
+import sys
+import tempfile
 import unittest
 
+def _exit_worker(*args):
+    # Stands in for the function run by a pool worker, killing the worker process.
+    os._exit(1)
+
+
 class DxfParseTests(unittest.TestCase):
 
     SIMPLE = '''0
@@ -35,6 +51,98 @@ class DxfParseTests(unittest.TestCase):
         assert rec4.code == 0 and rec4.value == 'EOF'
         self.assertRaises(StopIteration, itr.next)
 
+    def test_ascii_record_iterator_chunk_boundaries(self):
+        dxf = '0\r\nSECTION\r\n  2\r\nENTITIES\r\n999\r\nA comment\r\n  0\r\nENDSEC\r\n0\r\nEOF'
+        expected = [(0, 'SECTION'), (2, 'ENTITIES'), (999, 'A comment'), (0, 'ENDSEC'), (0, 'EOF')]
+        for chunk_size in xrange(1, len(dxf) + 2):
+            itr = pydxf.tools.ascii_record_iterator(StringIO.StringIO(dxf), chunk_size)
+            self.assertEqual([(rec.code, rec.value) for rec in itr], expected)
+
+    def test_ascii_record_iterator_bad_group(self):
+        itr = pydxf.tools.ascii_record_iterator(StringIO.StringIO('0\nSECTION\nabc\nENTITIES\n'))
+        self.assertRaises(pydxf.pydxf.FormatException, list, itr)
+
+    def test_mmap_record_iterator_matches_text(self):
+        dxf = '0\nSECTION\n  2\nENTITIES\n  0\nLINE\n  8\nOUTLINE\n 10\n1.5\n  0\nENDSEC\n  0\nEOF\n'
+        expected = [(rec.code, rec.value) for rec in pydxf.tools.ascii_record_iterator(StringIO.StringIO(dxf))]
+        for chunk_size in (3, 16, 4096):
+            itr = pydxf.tools.mmap_record_iterator(dxf, chunk_size)
+            self.assertEqual([(rec.code, rec.value) for rec in itr], expected)
+
+    def test_open_path_mmap_decodes_codepage(self):
+        dxf = ('0\nSECTION\n2\nHEADER\n9\n$DWGCODEPAGE\n3\nANSI_1251\n0\nENDSEC\n'
+               '0\nSECTION\n2\nENTITIES\n0\nLINE\n8\n\xd1\xeb\xee\xe9\n0\nENDSEC\n0\nEOF\n')
+        fd, path = tempfile.mkstemp(suffix='.dxf')
+        try:
+            os.write(fd, dxf)
+            os.close(fd)
+            df = pydxf.open_path(path, mmap=True)
+        finally:
+            os.remove(path)
+        self.assertEqual(df.sections['ENTITIES'][0].layer_name, u'\u0421\u043b\u043e\u0439')
+        self.assertEqual(df.sections['HEADER']['DWGCODEPAGE'], 'ANSI_1251')
+
+    @staticmethod
+    def _binary_dxf(records, wide_codes=True):
+        data = [pydxf.tools.BINARY_DXF_SENTINEL]
+        for code, fmt, value in records:
+            data.append(struct.pack('<h' if wide_codes else '<B', code))
+            data.append(value + '\x00' if fmt is None else struct.pack(fmt, value))
+        return ''.join(data)
+
+    def test_binary_record_iterator(self):
+        records = [(0, None, 'SECTION'), (2, None, 'ENTITIES'), (0, None, 'CIRCLE'), (8, None, 'OUTLINE'),
+                   (10, '<d', 1.5), (20, '<d', -2.0), (40, '<d', 3.25), (62, '<h', 5), (0, None, 'ENDSEC'),
+                   (0, None, 'EOF')]
+        for wide_codes in (True, False):
+            data = DxfParseTests._binary_dxf(records, wide_codes)
+            parsed = [(rec.code, rec.value) for rec in pydxf.tools.binary_record_iterator(data)]
+            self.assertEqual(parsed, [(code, value) for code, fmt, value in records])
+
+            df = pydxf.pydxf.DxfFile.make_file(pydxf.tools.binary_record_iterator(data))
+            circle = df.sections['ENTITIES'][0]
+            assert circle.name == 'CIRCLE' and circle.layer_name == 'OUTLINE'
+            assert circle.x == 1.5 and circle.y == -2.0 and circle.radius == 3.25
+
+    def test_binary_record_iterator_truncated(self):
+        data = DxfParseTests._binary_dxf([(0, None, 'SECTION'), (10, '<d', 1.0)])[:-3]
+        self.assertRaises(pydxf.pydxf.UnexpectedEOFException, list, pydxf.tools.binary_record_iterator(data))
+        self.assertRaises(pydxf.pydxf.UnexpectedEOFException, list,
+                          pydxf.tools.binary_record_iterator(StringIO.StringIO(data)))
+
+    def test_binary_record_iterator_stream(self):
+        records = [(0, None, 'SECTION'), (2, None, 'ENTITIES'), (0, None, 'CIRCLE'), (8, None, 'OUTLINE'),
+                   (10, '<d', 1.5), (62, '<h', 5), (90, '<i', 7), (0, None, 'ENDSEC'), (0, None, 'EOF')]
+
+        class TrickleStream(object):
+            # Returns at most a few bytes per read, as a pipe might, so that records are split between reads.
+            def __init__(self, data, size):
+                self.stream = StringIO.StringIO(data)
+                self.size = size
+
+            def read(self, size=-1):
+                return self.stream.read(self.size if size < 0 else min(size, self.size))
+
+        for wide_codes in (True, False):
+            data = DxfParseTests._binary_dxf(records, wide_codes)
+            for size in (1, 3, 7, len(data)):
+                records_read = pydxf.tools.stream_record_iterator(TrickleStream(data, size))
+                parsed = [(rec.code, rec.value) for rec in records_read]
+                self.assertEqual(parsed, [(code, value) for code, fmt, value in records])
+
+    def test_open_path_sniffs_binary(self):
+        data = DxfParseTests._binary_dxf([(0, None, 'SECTION'), (2, None, 'ENTITIES'), (0, None, 'LINE'),
+                                          (11, '<d', 4.0), (0, None, 'ENDSEC'), (0, None, 'EOF')])
+        fd, path = tempfile.mkstemp(suffix='.dxf')
+        try:
+            os.write(fd, data)
+            os.close(fd)
+            for use_mmap in (False, True):
+                df = pydxf.open_path(path, mmap=use_mmap)
+                assert df.sections['ENTITIES'][0].x2 == 4.0
+        finally:
+            os.remove(path)
+
     def test_block_iterator_entities(self):
         dxf = '''0
         SECTION
@@ -146,6 +254,29 @@ class DxfParseTests(unittest.TestCase):
         assert top_level[0].matches(DxfRecord(999, 'This is a comment'))
         assert top_level[1].matches(DxfRecord(0, 'ENDSEC'))
 
+    def test_record_blocks_match_iterator(self):
+        dxf = ('0\nSECTION\n2\nENTITIES\n999\ncomment\n0\nLINE\n8\n0\n0\nPOLYLINE\n0\nVERTEX\n10\n1\n0\nSEQEND\n'
+               '0\nENDSEC\n999\nafter\n0\nSECTION\n2\nTABLES\n0\nENDSEC\n0\nEOF\n')
+        records = list(pydxf.tools.ascii_record_iterator(StringIO.StringIO(dxf)))
+        rules = [(DxfRecord(0, None), DxfRecord(0, None), False),
+                 (DxfRecord(0, 'SECTION'), DxfRecord(0, 'ENDSEC'), True),
+                 (DxfRecord(0, 'SECTION'), [DxfRecord(0, 'ENDSEC'), DxfRecord(0, 'EOF')], True)]
+        as_pairs = lambda block: [(rec.code, rec.value) for rec in block]
+
+        for store in (records, pydxf.pydxf.DxfRecordList(records)):
+            for block_start, block_end, include_end in rules:
+                expected = pydxf.tools.record_block_iterator(records, block_start, block_end, include_end)
+                blocks = pydxf.tools.record_blocks(store, block_start, block_end, include_end)
+                self.assertEqual([as_pairs(block) for block in blocks], [as_pairs(block) for block in expected])
+                self.assertEqual(as_pairs(blocks.get_top_level_records()), as_pairs(expected.get_top_level_records()))
+
+        # Blocks are views of the records, and so are their slices.
+        line = list(pydxf.tools.record_blocks(records, DxfRecord(0, None), DxfRecord(0, None), start=2))[0]
+        assert isinstance(line, pydxf.tools.record_slice)
+        assert line[0] is records[3] and line[-1] is records[4]
+        self.assertEqual(as_pairs(line[1:]), [(8, '0')])
+        self.assertRaises(IndexError, line.__getitem__, 2)
+
     def test_parse_simple_file(self):
         df = pydxf.pydxf.DxfFile.make_file(pydxf.tools.ascii_record_iterator(StringIO.StringIO(DxfParseTests.SIMPLE)))
         assert len(list(df.sections)) == 1
@@ -165,6 +296,780 @@ class DxfParseTests(unittest.TestCase):
         sec = df.sections['ENTITIES']
         assert len(list(sec.records)) == 0
 
+    def test_iter_entities(self):
+        dxf = StringIO.StringIO('''0
+        SECTION
+        2
+        HEADER
+        9
+        $INSUNITS
+        70
+        4
+        0
+        ENDSEC
+        0
+        SECTION
+        2
+        ENTITIES
+        0
+        LINE
+        8
+        OUTLINE
+        10
+        1
+        0
+        CIRCLE
+        40
+        2
+        0
+        ENDSEC
+        0
+        SECTION
+        2
+        OBJECTS
+        0
+        ENDSEC''')
+        itr = pydxf.iter_entities(dxf)
+        line = next(itr)
+        assert line.name == 'LINE' and line.layer_name == 'OUTLINE' and line.x1 == 1
+        circle = next(itr)
+        assert circle.name == 'CIRCLE' and circle.radius == 2
+        self.assertRaises(StopIteration, next, itr)
+
+    def test_iter_entities_path(self):
+        fd, path = tempfile.mkstemp(suffix='.dxf')
+        try:
+            os.write(fd, '0\nSECTION\n2\nENTITIES\n0\nARC\n50\n90\n0\nENDSEC\n0\nEOF\n')
+            os.close(fd)
+            for use_mmap in (False, True):
+                entities = list(pydxf.iter_entities(path, mmap=use_mmap))
+                assert len(entities) == 1 and entities[0].start_angle == 90
+        finally:
+            os.remove(path)
+
+    def test_index_sections(self):
+        dxf = '  0\r\nSECTION\r\n  2\r\nHEADER\r\n  0\r\nENDSEC\r\n  0\r\nSECTION\r\n  2\r\nENTITIES\r\n  8\r\n0\r\n'
+        sections = pydxf.tools.index_sections(dxf)
+        self.assertEqual([name for name, start, end in sections], ['HEADER', 'ENTITIES'])
+        self.assertEqual(dxf[sections[0][1]:sections[0][2]], '  0\r\nSECTION\r\n  2\r\nHEADER\r\n  0\r\nENDSEC\r\n')
+        self.assertEqual(sections[1][1:], (sections[0][2], len(dxf)))
+
+    def test_open_path_lazy(self):
+        fd, path = tempfile.mkstemp(suffix='.dxf')
+        try:
+            os.write(fd, '0\nSECTION\n2\nHEADER\n9\n$INSUNITS\n70\n4\n0\nENDSEC\n'
+                         '0\nSECTION\n2\nENTITIES\n0\nLINE\n10\n2.5\n0\nENDSEC\n0\nEOF\n')
+            os.close(fd)
+            df = pydxf.open_path(path, lazy=True)
+        finally:
+            os.remove(path)
+        self.assertEqual(list(df.sections), ['HEADER', 'ENTITIES'])
+        assert 'OBJECTS' not in df.sections and df.sections.get('OBJECTS') is None
+        assert not df.sections.is_loaded('HEADER')
+        assert df.sections['ENTITIES'][0].x1 == 2.5
+        assert df.sections.is_loaded('ENTITIES') and not df.sections.is_loaded('HEADER')
+        self.assertEqual(df.sections['HEADER']['INSUNITS'], 4)
+
+    ENTITIES = '''0
+        SECTION
+        2
+        ENTITIES
+        0
+        LINE
+        8
+        OUTLINE
+        10
+        0
+        20
+        0
+        11
+        0
+        21
+        1
+        0
+        CIRCLE
+        8
+        OUTLINE
+        10
+        2
+        20
+        2
+        40
+        2
+        0
+        LINE
+        8
+        SILK
+        10
+        4
+        20
+        4
+        11
+        5
+        21
+        5
+        0
+        ENDSEC'''
+
+    SECTIONS = '''0
+        SECTION
+        2
+        HEADER
+        9
+        $INSUNITS
+        70
+        4
+        0
+        ENDSEC
+        999
+        Between sections
+        0
+        SECTION
+        2
+        TABLES
+        0
+        TABLE
+        2
+        LAYER
+        0
+        ENDTAB
+        0
+        ENDSEC
+        0
+        SECTION
+        2
+        ENTITIES
+        0
+        LINE
+        10
+        1
+        0
+        ENDSEC
+        0
+        EOF'''
+
+    def test_ascii_record_iterator_sections(self):
+        for chunk_size in xrange(1, 40):
+            itr = pydxf.tools.ascii_record_iterator(StringIO.StringIO(DxfParseTests.SECTIONS), chunk_size,
+                                                    sections=('HEADER', 'ENTITIES'))
+            values = [rec.value for rec in itr]
+            self.assertEqual(values, ['SECTION', 'HEADER', '$INSUNITS', '4', 'ENDSEC', 'Between sections',
+                                      'SECTION', 'ENTITIES', 'LINE', '1', 'ENDSEC', 'EOF'])
+
+    def test_make_file_sections(self):
+        records = pydxf.tools.ascii_record_iterator(StringIO.StringIO(DxfParseTests.SECTIONS))
+        df = pydxf.pydxf.DxfFile.make_file(records, sections=('TABLES',))
+        self.assertEqual(list(df.sections), ['TABLES'])
+        assert df.sections['TABLES']['LAYER'] is not None
+
+    def test_open_path_sections(self):
+        fd, path = tempfile.mkstemp(suffix='.dxf')
+        try:
+            os.write(fd, DxfParseTests.SECTIONS)
+            os.close(fd)
+            for options in ({}, {'mmap': True}, {'lazy': True}):
+                df = pydxf.open_path(path, sections=('ENTITIES',), **options)
+                self.assertEqual(list(df.sections), ['ENTITIES'])
+                assert df.sections['ENTITIES'][0].x1 == 1
+        finally:
+            os.remove(path)
+
+    def test_record_list(self):
+        records = pydxf.pydxf.DxfRecordList([DxfRecord(8, 'OUTLINE'), DxfRecord(10, '1.5')])
+        records.append(DxfRecord(1071, '7'))
+        self.assertEqual(len(records), 3)
+        assert records[0].matches(DxfRecord(8, 'OUTLINE'))
+        assert records[-1].matches(DxfRecord(1071, '7'))
+        self.assertEqual([rec.code for rec in records[1:]], [10, 1071])
+        self.assertEqual(list(records.codes), [8, 10, 1071])
+        self.assertEqual(records.values, ['OUTLINE', '1.5', '7'])
+
+        copied = pickle.loads(pickle.dumps(records, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual([(rec.code, rec.value) for rec in copied], [(8, 'OUTLINE'), (10, '1.5'), (1071, '7')])
+
+    def test_entity_columns(self):
+        df = pydxf.pydxf.DxfFile.make_file(
+            pydxf.tools.ascii_record_iterator(StringIO.StringIO(DxfParseTests.ENTITIES)))
+        sec = df.sections['ENTITIES']
+        lines = sec.columns('LINE')
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(list(lines['x1']), [0.0, 4.0])
+        self.assertEqual(list(lines['y2']), [1.0, 5.0])
+        self.assertEqual([lines.layers[i] for i in lines.layer_index], ['OUTLINE', 'SILK'])
+        self.assertEqual(list(sec.columns('CIRCLE')['radius']), [2.0])
+
+        new_line = pydxf.entity.LineEntity()
+        new_line.x1 = 7
+        sec.add_entities(new_line)
+        self.assertEqual(list(lines['x1']), [0.0, 4.0, 7.0])
+
+        lines.update('x1', [1, 2, 3])
+        self.assertEqual([line.x1 for line in lines.entities], [1.0, 2.0, 3.0])
+        self.assertRaises(ValueError, sec.columns, 'TEXT')
+
+    def test_swap_arc_winding_and_rotate_arcs(self):
+        df = pydxf.pydxf.DxfFile.make_file(pydxf.tools.ascii_record_iterator(StringIO.StringIO('''0
+        SECTION
+        2
+        ENTITIES
+        0
+        ARC
+        50
+        45
+        51
+        135
+        0
+        LINE
+        0
+        ARC
+        50
+        0
+        51
+        350
+        0
+        ENDSEC''')))
+        arcs = [ent for ent in df.sections['ENTITIES'] if ent.name == 'ARC']
+        pydxf.tools.swap_arc_winding(df)
+        self.assertEqual([(arc.start_angle, arc.end_angle) for arc in arcs], [(315, 225), (0, 10)])
+        pydxf.tools.rotate_arcs(df, 90)
+        self.assertEqual([(arc.start_angle, arc.end_angle) for arc in arcs], [(45, 315), (90, 100)])
+        self.assertEqual(list(df.sections['ENTITIES'].columns('ARC')['start_angle']), [45, 90])
+
+        # Angles set directly on an arc after the columns were built are the ones rotated.
+        arcs[0].start_angle, arcs[0].end_angle = 0, 90
+        pydxf.tools.rotate_arcs(df, 10)
+        self.assertEqual((arcs[0].start_angle, arcs[0].end_angle), (10, 100))
+        self.assertEqual(list(df.sections['ENTITIES'].columns('ARC')['start_angle']), [10, 100])
+
+    def test_bulge_to_arcs(self):
+        xs = [0.0, 2.0, 2.0, 0.0]
+        ys = [0.0, 0.0, 2.0, 2.0]
+        bulges = [1.0, 0.0, -0.5, 0.25]
+        segments, center_xs, center_ys, radii, start_angles, end_angles = pydxf.tools.bulge_to_arcs(
+            xs, ys, bulges, closed=True)
+        self.assertEqual(list(segments), [0, 2, 3])
+
+        vertices = []
+        for x, y, bulge in zip(xs, ys, bulges):
+            vertex = pydxf.entity.VertexEntity()
+            vertex.x, vertex.y, vertex.bulge = x, y, bulge
+            vertices.append(vertex)
+
+        for n, i in enumerate(segments):
+            center, radius, start_angle, end_angle = pydxf.tools.bulge_to_arc(
+                vertices[i], vertices[(i + 1) % 4], bulges[i])
+            self.assertAlmostEqual(center_xs[n], center[0])
+            self.assertAlmostEqual(center_ys[n], center[1])
+            self.assertAlmostEqual(radii[n], radius)
+            self.assertAlmostEqual(start_angles[n], start_angle)
+            self.assertAlmostEqual(end_angles[n], end_angle)
+
+        self.assertEqual(list(pydxf.tools.bulge_to_arcs(xs, ys, bulges)[0]), [0, 2])
+
+    POLYLINE = '''0
+        SECTION
+        2
+        ENTITIES
+        0
+        POLYLINE
+        8
+        OUTLINE
+        66
+        1
+        70
+        1
+        0
+        VERTEX
+        8
+        OUTLINE
+        10
+        0
+        20
+        0
+        42
+        0.5
+        0
+        VERTEX
+        8
+        OUTLINE
+        10
+        3
+        20
+        0
+        70
+        32
+        0
+        VERTEX
+        8
+        OUTLINE
+        10
+        3
+        20
+        4
+        0
+        SEQEND
+        8
+        OUTLINE
+        0
+        CIRCLE
+        40
+        1
+        0
+        ENDSEC'''
+
+    def test_polyline_assembly(self):
+        df = pydxf.pydxf.DxfFile.make_file(
+            pydxf.tools.ascii_record_iterator(StringIO.StringIO(DxfParseTests.POLYLINE)))
+        sec = df.sections['ENTITIES']
+        self.assertEqual([ent.name for ent in sec], ['POLYLINE', 'CIRCLE'])
+
+        polyline = sec[0]
+        assert polyline.closed and polyline.layer_name == 'OUTLINE'
+        self.assertEqual(polyline.seqend.name, 'SEQEND')
+        self.assertEqual(len(polyline.vertices), 3)
+        self.assertEqual(list(polyline.vertices.x), [0, 3, 3])
+        self.assertEqual(list(polyline.vertices.y), [0, 0, 4])
+        self.assertEqual(list(polyline.vertices.bulge), [0.5, 0, 0])
+        self.assertEqual([(rec.code, rec.value) for rec in polyline.vertices.records(1)], [(8, 'OUTLINE'), (70, '32')])
+
+        vertex = polyline.vertices[2]
+        assert vertex.name == 'VERTEX' and vertex.layer_name == 'OUTLINE' and vertex.x == 3 and vertex.y == 4
+
+        columns = sec.columns('VERTEX')
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(list(columns.polyline_index), [0, 0, 0])
+        columns.update('x', [1, 2, 3])
+        self.assertEqual(list(polyline.vertices.x), [1, 2, 3])
+
+        streamed = list(pydxf.iter_entities(StringIO.StringIO(DxfParseTests.POLYLINE)))
+        self.assertEqual([ent.name for ent in streamed], ['POLYLINE', 'CIRCLE'])
+        self.assertEqual(len(streamed[0].vertices), 3)
+
+    def test_split_entity_ranges(self):
+        lines = DxfParseTests.POLYLINE.split('\n')
+        dxf = '\n'.join(lines[:4] + lines[4:-2] * 5 + lines[-2:]) + '\n'
+        start, end = pydxf.tools.index_sections(dxf)[0][1:]
+        ranges = pydxf.tools.split_entity_ranges(dxf, start, end, 20)
+        self.assertEqual(len(ranges), 10)
+        self.assertEqual(ranges[0][0], dxf.index('        0\n        POLYLINE'))
+        self.assertEqual(ranges[-1][1], end)
+        for range_start, range_end in ranges:
+            assert dxf[range_start:range_end].split()[1] in ('POLYLINE', 'CIRCLE')
+
+    def test_open_path_workers(self):
+        lines = DxfParseTests.POLYLINE.split('\n')
+        fd, path = tempfile.mkstemp(suffix='.dxf')
+        try:
+            os.write(fd, '0\nSECTION\n2\nHEADER\n9\n$INSUNITS\n70\n4\n0\nENDSEC\n')
+            os.write(fd, '\n'.join(lines[:4] + lines[4:-2] * 50 + lines[-2:]) + '\n0\nEOF\n')
+            os.close(fd)
+            serial = pydxf.open_path(path)
+            parallel = pydxf.open_path(path, workers=2)
+
+            # A worker that dies is reported rather than waited on forever.
+            parse_entities_range, pydxf.section.parse_entities_range = pydxf.section.parse_entities_range, _exit_worker
+            try:
+                self.assertRaises(RuntimeError, pydxf.open_path, path, workers=2)
+            finally:
+                pydxf.section.parse_entities_range = parse_entities_range
+        finally:
+            os.remove(path)
+
+        self.assertEqual(sorted(parallel.sections), ['ENTITIES', 'HEADER'])
+        self.assertEqual([ent.name for ent in parallel.sections['ENTITIES']],
+                         [ent.name for ent in serial.sections['ENTITIES']])
+        for polyline in parallel.sections['ENTITIES'][::2]:
+            self.assertEqual(list(polyline.vertices.x), [0, 3, 3])
+            self.assertEqual(polyline.seqend.name, 'SEQEND')
+        self.assertEqual(parallel.extents, serial.extents)
+
+    def test_entity_filters(self):
+        entities = DxfParseTests.ENTITIES.split('\n')
+        polyline = DxfParseTests.POLYLINE.split('\n')
+        dxf = '\n'.join(line.strip() for line in entities[:-2] + polyline[4:] + ['0', 'EOF'])
+        cases = [
+            (('LINE', 'POLYLINE'), None, [('LINE', 'OUTLINE'), ('LINE', 'SILK'), ('POLYLINE', 'OUTLINE')]),
+            (None, ('OUTLINE',), [('LINE', 'OUTLINE'), ('CIRCLE', 'OUTLINE'), ('POLYLINE', 'OUTLINE')]),
+            (('CIRCLE',), ('OUTLINE', ''), [('CIRCLE', 'OUTLINE'), ('CIRCLE', '')]),
+        ]
+
+        for entity_types, layers, expected in cases:
+            # Small chunks leave entities split across blocks before their layer records.
+            for chunk_size in (7, 30, 4096):
+                records = pydxf.tools.ascii_record_iterator(StringIO.StringIO(dxf), chunk_size,
+                                                            entity_types=entity_types, layers=layers)
+                df = pydxf.pydxf.DxfFile.make_file(records)
+                self.assertEqual([(ent.name, ent.layer_name) for ent in df.sections['ENTITIES']], expected)
+                for ent in df.sections['ENTITIES']:
+                    if ent.name == 'POLYLINE':
+                        self.assertEqual(list(ent.vertices.x), [0, 3, 3])
+                        self.assertEqual(ent.seqend.name, 'SEQEND')
+
+        fd, path = tempfile.mkstemp(suffix='.dxf')
+        try:
+            os.write(fd, dxf)
+            os.close(fd)
+            for options in ({}, {'mmap': True}, {'lazy': True}, {'workers': 2}):
+                df = pydxf.open_path(path, entity_types=('LINE',), layers=(u'SILK',), **options)
+                self.assertEqual([(ent.name, ent.x2) for ent in df.sections['ENTITIES']], [('LINE', 5)])
+            self.assertEqual([ent.name for ent in pydxf.iter_entities(path, layers=('OUTLINE',))],
+                             ['LINE', 'CIRCLE', 'POLYLINE'])
+        finally:
+            os.remove(path)
+
+        # Entities without a layer record are on the layer '', including those at the end of a worker's range.
+        fd, path = tempfile.mkstemp(suffix='.dxf')
+        try:
+            os.write(fd, '0\nSECTION\n2\nENTITIES\n' + '0\nLINE\n10\n1\n' * 200 + '0\nENDSEC\n0\nEOF\n')
+            os.close(fd)
+            for options in ({}, {'mmap': True}, {'lazy': True}, {'workers': 2}):
+                df = pydxf.open_path(path, layers=('',), **options)
+                self.assertEqual(len(df.sections['ENTITIES']), 200)
+        finally:
+            os.remove(path)
+
+    def test_open_many(self):
+        directory = tempfile.mkdtemp()
+        paths = [os.path.join(directory, name) for name in ('a.dxf', 'bad.dxf', 'c.dxf')]
+        try:
+            for path in paths:
+                with open(path, 'w') as fo:
+                    fo.write('junk' if path.endswith('bad.dxf') else DxfParseTests.POLYLINE + '\n0\nEOF\n')
+
+            results = list(pydxf.open_many(paths, workers=2, max_pending=1))
+            self.assertEqual([path for path, result in results], paths)
+            assert isinstance(results[1][1], pydxf.pydxf.FormatException)
+            self.assertEqual([ent.name for ent in results[2][1].sections['ENTITIES']], ['POLYLINE', 'CIRCLE'])
+            self.assertEqual(len(results[2][1].sections['ENTITIES'][0].vertices), 3)
+
+            unordered = list(pydxf.open_many(iter(paths), workers=2, ordered=False))
+            self.assertEqual(sorted(path for path, result in unordered), paths)
+
+            # Files can be summarized in the workers, so only the summaries come back.
+            summaries = dict(pydxf.open_many(paths, workers=2, process=pydxf.cli.summarize))
+            self.assertEqual(summaries[paths[2]]['entity_types'], {'POLYLINE': 1, 'CIRCLE': 1})
+            assert isinstance(summaries[paths[1]], pydxf.pydxf.FormatException)
+
+            # A worker that dies never sends a result back, which is reported rather than waited on forever.
+            open_pickled, pydxf._open_pickled = pydxf._open_pickled, _exit_worker
+            try:
+                for ordered in (True, False):
+                    self.assertRaises(RuntimeError, list, pydxf.open_many(paths, workers=2, ordered=ordered))
+            finally:
+                pydxf._open_pickled = open_pickled
+
+            report = StringIO.StringIO()
+            stdout, stderr, sys.stdout, sys.stderr = sys.stdout, sys.stderr, report, StringIO.StringIO()
+            try:
+                status = pydxf.cli.main([directory, '--workers', '1', '--json'])
+            finally:
+                sys.stdout, sys.stderr = stdout, stderr
+            self.assertEqual(status, 1)
+            summaries = [json.loads(line) for line in report.getvalue().splitlines()]
+            self.assertEqual([summary['path'] for summary in summaries], paths)
+            self.assertEqual(summaries[0]['entity_types'], {'POLYLINE': 1, 'CIRCLE': 1})
+            assert 'error' in summaries[1]
+        finally:
+            shutil.rmtree(directory)
+
+    def test_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'drawing.dxf')
+            with open(path, 'w') as fo:
+                fo.write(DxfParseTests.POLYLINE + '\n0\nEOF\n')
+
+            cache = pydxf.cache.DxfCache(os.path.join(directory, 'cache'))
+            self.assertEqual(os.stat(cache.directory).st_mode & 0o777, 0o700)
+            key = cache.key(path)
+            assert cache.get(key) is None
+            parsed = pydxf.open_path(path, cache=cache)
+            cached = cache.get(key)
+            assert cached is not parsed
+            self.assertEqual([ent.name for ent in cached.sections['ENTITIES']], ['POLYLINE', 'CIRCLE'])
+            self.assertEqual(list(cached.sections['ENTITIES'][0].vertices.y), [0, 0, 4])
+            self.assertNotEqual(cache.key(path, ['ENTITIES']), key)
+            self.assertNotEqual(cache.key(path, mmap=True), key)
+
+            # Lazily loaded files are stored fully loaded.
+            cache.put('lazy', pydxf.open_path(path, lazy=True))
+            self.assertEqual(cache.get('lazy').sections['ENTITIES'][1].name, 'CIRCLE')
+
+            # Entries from other versions are dropped.
+            entry = os.path.join(cache.directory, key + pydxf.cache.ENTRY_SUFFIX)
+            with open(entry, 'rb') as fi:
+                data = fi.read()
+            with open(entry, 'wb') as fo:
+                fo.write(data.replace('pydxf-cache', 'pydxf-cache 0', 1))
+            assert cache.get(key) is None and not os.path.exists(entry)
+
+            # The least recently used entries are evicted to get under max_size.
+            cache.put(key, parsed)
+            os.utime(os.path.join(cache.directory, 'lazy' + pydxf.cache.ENTRY_SUFFIX), (0, 0))
+            cache.max_size = os.path.getsize(entry)
+            cache.evict()
+            assert cache.get(key) is not None and cache.get('lazy') is None
+        finally:
+            shutil.rmtree(directory)
+
+    def test_snapshot(self):
+        df = pydxf.pydxf.DxfFile.make_file(pydxf.tools.ascii_record_iterator(StringIO.StringIO(
+            DxfParseTests.POLYLINE.replace('CIRCLE', 'CIRCLE\n8\nSILK\n1001\nAPP\n1000\n\xc3\xa9'))))
+        circle = df.sections['ENTITIES'][1]
+        circle.add_records(DxfRecord(1000, u'\xe9'))
+        fd, path = tempfile.mkstemp(suffix='.snapshot')
+        os.close(fd)
+        try:
+            df.save_snapshot(path)
+            loaded = pydxf.load_snapshot(path)
+        finally:
+            os.remove(path)
+
+        sec = loaded.sections['ENTITIES']
+        polyline, loaded_circle = sec
+        assert type(polyline) is pydxf.entity.PolyLineEntity and polyline.closed
+        self.assertEqual(list(polyline.vertices.x), [0, 3, 3])
+        self.assertEqual([(rec.code, rec.value) for rec in polyline.vertices.records(1)], [(8, 'OUTLINE'), (70, '32')])
+        self.assertEqual([(rec.code, rec.value) for rec in polyline.seqend.records], [(0, 'SEQEND'), (8, 'OUTLINE')])
+        self.assertEqual((loaded_circle.layer_name, loaded_circle.radius), ('SILK', 1))
+        self.assertEqual([(rec.code, rec.value) for rec in loaded_circle.records],
+                         [(0, 'CIRCLE'), (1001, 'APP'), (1000, '\xc3\xa9'), (1000, u'\xe9')])
+        self.assertEqual(type(loaded_circle.records[3].value), unicode)
+        self.assertEqual(loaded.extents, df.extents)
+
+        # The entities can still be replaced outright, and everything derived from them follows.
+        sec.entities = [loaded_circle]
+        self.assertEqual(list(sec), [loaded_circle])
+        self.assertEqual(loaded.extents, loaded_circle.extents())
+        self.assertEqual(sec.columns('VERTEX')['x'], array.array('d'))
+
+    def test_header_variables(self):
+        dxf = ('0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1015\n9\n$INSUNITS\n70\n4\n'
+               '9\n$EXTMIN\n10\n0.5\n20\n-1\n30\n0\n9\n$LIMMIN\n10\n0\n20\n0\n9\n$ANGBASE\n50\n90.0\n'
+               '9\n$HANDSEED\n5\n20000\n0\nENDSEC\n0\nEOF\n')
+        df = pydxf.pydxf.DxfFile.make_file(pydxf.tools.ascii_record_iterator(StringIO.StringIO(dxf)))
+        header = df.sections['HEADER']
+        self.assertEqual(list(header), ['ACADVER', 'INSUNITS', 'EXTMIN', 'LIMMIN', 'ANGBASE', 'HANDSEED'])
+        assert not header.variables._values
+
+        self.assertEqual(header['INSUNITS'], 4)
+        self.assertEqual(header.variables._values.keys(), ['INSUNITS'])
+        self.assertEqual((header['EXTMIN'], header['LIMMIN']), ((0.5, -1, 0), (0, 0)))
+        self.assertEqual((header['ANGBASE'], header['HANDSEED'], header['ACADVER']), (90, '20000', 'AC1015'))
+        assert header['MISSING'] is None and 'MISSING' not in header
+
+        # Unchanged variables are written as they were read, and assigned ones with the codes they were read with.
+        header.variables['EXTMIN'] = (1.5, 2.0)
+        header.variables['DWGCODEPAGE'] = 'ANSI_1252'
+        written = ''.join('%d\n%s\n' % (rec.code, rec.value) for rec in header.iter_records())
+        self.assertEqual(written, '0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1015\n9\n$INSUNITS\n70\n4\n'
+                                  '9\n$EXTMIN\n10\n1.5\n20\n2.0\n9\n$LIMMIN\n10\n0\n20\n0\n9\n$ANGBASE\n50\n90.0\n'
+                                  '9\n$HANDSEED\n5\n20000\n9\n$DWGCODEPAGE\n1\nANSI_1252\n0\nENDSEC\n')
+
+    def test_write_round_trip(self):
+        dxf = ('0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1015\n9\n$INSUNITS\n70\n4\n9\n$EXTMIN\n10\n0.5\n20\n0\n'
+               '0\nENDSEC\n0\nSECTION\n2\nTABLES\n0\nTABLE\n2\nLAYER\n70\n1\n0\nLAYER\n2\nOUTLINE\n70\n0\n62\n1\n'
+               '6\nCONTINUOUS\n0\nENDTAB\n0\nENDSEC\n0\nSECTION\n2\nENTITIES\n0\nLINE\n5\n2A\n100\nAcDbEntity\n'
+               '8\nOUTLINE\n100\nAcDbLine\n10\n0.1\n20\n0\n30\n0\n11\n1\n21\n2\n31\n0\n1001\nAPP\n0\nLWPOLYLINE\n'
+               '8\nSILK\n90\n2\n70\n1\n10\n0\n20\n0\n42\n0.5\n10\n3\n20\n0\n40\n0.1\n') + \
+              '\n'.join(DxfParseTests.POLYLINE.split('\n')[4:]) + '\n0\nEOF\n'
+        df = pydxf.pydxf.DxfFile.make_file(pydxf.tools.ascii_record_iterator(StringIO.StringIO(dxf)))
+        df.sections['ENTITIES'][0].x2 = 1 / 3.0
+        out = StringIO.StringIO()
+        df.write(out)
+
+        written = out.getvalue()
+        self.assertEqual(written[:16], '  0\nSECTION\n  2\n')
+        assert written.endswith('  0\nENDSEC\n  0\nEOF\n')
+        assert '100\nAcDbEntity\n  8\nOUTLINE\n100\nAcDbLine\n 10\n0.1\n 20\n0.0\n 30\n0\n' \
+               ' 11\n0.3333333333333333\n 21\n2.0\n 31\n0\n1001\nAPP\n' in written
+
+        again = pydxf.pydxf.DxfFile.make_file(pydxf.tools.ascii_record_iterator(StringIO.StringIO(written)))
+        header = again.sections['HEADER']
+        self.assertEqual((header['ACADVER'], header['INSUNITS']), ('AC1015', 4))
+        self.assertEqual(header['EXTMIN'], (0.5, 0))
+        layer, = again.sections['TABLES']['LAYER'].layers
+        self.assertEqual((layer.name, layer.color_index), ('OUTLINE', 1))
+        self.assertEqual([(rec.code, rec.value) for rec in layer.records], [(70, '0'), (6, 'CONTINUOUS')])
+
+        line, lwpolyline, polyline, circle = again.sections['ENTITIES']
+        self.assertEqual((line.x1, line.y1, line.x2, line.y2, line.layer_name), (0.1, 0, 1 / 3.0, 2, 'OUTLINE'))
+        self.assertEqual([(rec.code, rec.value) for rec in line.records],
+                         [(0, 'LINE'), (5, '2A'), (100, 'AcDbEntity'), (100, 'AcDbLine'), (30, '0'), (31, '0'),
+                          (1001, 'APP')])
+        assert lwpolyline.closed and lwpolyline.layer_name == 'SILK'
+        self.assertEqual(list(lwpolyline.vertices.bulge), [0.5, 0])
+        self.assertEqual([(rec.code, rec.value) for rec in lwpolyline.vertices.records(1)], [(40, '0.1')])
+        assert polyline.closed and len(polyline.vertices) == 3 and polyline.seqend is not None
+        self.assertEqual(list(polyline.vertices.bulge), [0.5, 0, 0])
+        self.assertEqual([(rec.code, rec.value) for rec in polyline.vertices.records(1)], [(8, 'OUTLINE'), (70, '32')])
+        self.assertEqual(circle.radius, 1)
+
+    def test_writer_streams_entities(self):
+        out = StringIO.StringIO()
+        with pydxf.writer.DxfWriter(out, 'cp1252', buffer_size=16) as dxf_writer:
+            dxf_writer.begin_section('ENTITIES')
+            dxf_writer.write_entities(pydxf.iter_entities(StringIO.StringIO(DxfParseTests.ENTITIES)))
+            dxf_writer.write_record(999, u'caf\xe9 \u2603')
+            dxf_writer.end_section()
+            assert len(out.getvalue()) > 0
+        assert out.getvalue().endswith('999\ncaf\xe9 \\U+2603\n  0\nENDSEC\n  0\nEOF\n')
+
+        df = pydxf.pydxf.DxfFile.make_file(pydxf.tools.ascii_record_iterator(StringIO.StringIO(out.getvalue())))
+        self.assertEqual([(ent.name, ent.layer_name) for ent in df.sections['ENTITIES']],
+                         [('LINE', 'OUTLINE'), ('CIRCLE', 'OUTLINE'), ('LINE', 'SILK')])
+
+    def test_field_schema(self):
+        assert pydxf.entity.LineEntity.FIELDS.dispatch[11] == ('x2', float)
+        assert pydxf.entity.LineEntity.FIELDS.dispatch[8] == ('layer_name', None)
+
+        schema = pydxf.entity.DxfEntity.FIELDS.extend({40: ('radius', float), 100: (None, None)})
+        ent = schema.parse(pydxf.entity.DxfEntity(), [DxfRecord(8, 'SILK'), DxfRecord(40, '2.5'),
+                                                      DxfRecord(100, 'AcDbEntity'), DxfRecord(5, '2F')])
+        assert ent.layer_name == 'SILK'
+        assert ent.radius == 2.5
+        assert [(rec.code, rec.value) for rec in ent.records] == [(5, '2F')]
+
+    def test_lwpolyline(self):
+        df = pydxf.pydxf.DxfFile.make_file(pydxf.tools.ascii_record_iterator(StringIO.StringIO('''0
+        SECTION
+        2
+        ENTITIES
+        0
+        LWPOLYLINE
+        5
+        2F
+        8
+        OUTLINE
+        90
+        3
+        70
+        1
+        38
+        1.5
+        10
+        0
+        20
+        0
+        42
+        -0.5
+        10
+        3
+        20
+        0
+        40
+        0.1
+        41
+        0.2
+        10
+        3
+        20
+        4
+        0
+        ENDSEC''')))
+        polyline = df.sections['ENTITIES'][0]
+        assert isinstance(polyline, pydxf.entity.LwPolyLineEntity)
+        assert polyline.closed and polyline.layer_name == 'OUTLINE' and polyline.elevation == 1.5
+        self.assertEqual(list(polyline.vertices.x), [0, 3, 3])
+        self.assertEqual(list(polyline.vertices.y), [0, 0, 4])
+        self.assertEqual(list(polyline.vertices.z), [1.5, 1.5, 1.5])
+        self.assertEqual(list(polyline.vertices.bulge), [-0.5, 0, 0])
+        self.assertEqual([(rec.code, rec.value) for rec in polyline.vertices.records(1)], [(40, '0.1'), (41, '0.2')])
+        self.assertEqual([(rec.code, rec.value) for rec in polyline.records], [(0, 'LWPOLYLINE'), (5, '2F')])
+
+    def test_arc_extents(self):
+        extents = pydxf.tools.arc_extents(0, 0, 2, 45, 135)
+        self.assertAlmostEqual(extents[0], -2 ** 0.5)
+        self.assertAlmostEqual(extents[1], 2 ** 0.5)
+        self.assertAlmostEqual(extents[2], 2 ** 0.5)
+        self.assertAlmostEqual(extents[3], 2)
+        self.assertEqual(pydxf.tools.arc_extents(1, 1, 1, 0, 360), (0, 0, 2, 2))
+        self.assertEqual(pydxf.tools.ocs_extents((1, 2, 3, 4), -1), (-3, 2, -1, 4))
+
+    def test_query_bbox(self):
+        df = pydxf.pydxf.DxfFile.make_file(
+            pydxf.tools.ascii_record_iterator(StringIO.StringIO(DxfParseTests.ENTITIES)))
+        sec = df.sections['ENTITIES']
+        self.assertEqual([ent.name for ent in sec.query_bbox(-1, -1, 10, 10)], ['LINE', 'CIRCLE', 'LINE'])
+        self.assertEqual(sec.query_bbox(4.5, 4.5, 6, 6), [sec[2]])
+        self.assertEqual(sec.query_bbox(100, 100, 200, 200), [])
+
+        far_arc = pydxf.entity.ArcEntity()
+        far_arc.x, far_arc.y, far_arc.radius, far_arc.end_angle = 150, 150, 10, 90
+        sec.add_entities(far_arc)
+        self.assertEqual(sec.query_bbox(100, 100, 200, 200), [far_arc])
+        self.assertEqual(sec.query_bbox(100, 100, 145, 200), [])
+
+        # Rotating the arc to 180..270 moves it into the query rectangle.
+        pydxf.tools.rotate_arcs(df, 180)
+        self.assertEqual(sec.query_bbox(100, 100, 145, 200), [far_arc])
+
+    def test_extents(self):
+        df = pydxf.pydxf.DxfFile.make_file(
+            pydxf.tools.ascii_record_iterator(StringIO.StringIO(DxfParseTests.ENTITIES)))
+        self.assertEqual(df.extents, (0, 0, 5, 5))
+        self.assertEqual(df.layer_extents, {'OUTLINE': (0, 0, 4, 4), 'SILK': (4, 4, 5, 5)})
+
+        arc = pydxf.entity.ArcEntity()
+        arc.layer_name = 'SILK'
+        arc.x, arc.y, arc.radius, arc.start_angle, arc.end_angle = 10, 0, 1, 0, 90
+        df.sections['ENTITIES'].add_entities(arc)
+        self.assertEqual(df.layer_extents['SILK'], (4, 0, 11, 5))
+
+        # Rotating the arc to 180..270 shrinks the layer back on the right.
+        pydxf.tools.rotate_arcs(df, 180)
+        for actual, expected in zip(df.layer_extents['SILK'], (4, -1, 10, 5)):
+            self.assertAlmostEqual(actual, expected)
+        for actual, expected in zip(df.extents, (0, -1, 10, 5)):
+            self.assertAlmostEqual(actual, expected)
+
+        # Moving every entity off a layer drops that layer's box.
+        sec = df.sections['ENTITIES']
+        outline = df.entities_on_layer('OUTLINE')
+        for ent in outline:
+            ent.layer_name = 'SILK'
+        sec.entities_changed(outline)
+        self.assertEqual(df.layer_extents.keys(), ['SILK'])
+        for actual, expected in zip(df.layer_extents['SILK'], (0, -1, 10, 5)):
+            self.assertAlmostEqual(actual, expected)
+        self.assertEqual(len(df.entities_on_layer('SILK')), len(sec))
+
+    def test_layer_registry(self):
+        df = pydxf.pydxf.DxfFile.make_file(
+            pydxf.tools.ascii_record_iterator(StringIO.StringIO(DxfParseTests.ENTITIES)))
+        layers = df.layers
+        assert df.layers is layers
+        self.assertEqual(sorted(layers), ['OUTLINE', 'SILK'])
+        # Looking up a missing layer gives a default one without adding it to the registry.
+        self.assertEqual(layers['MISSING'].name, 'MISSING')
+        assert 'MISSING' not in df.layers
+        self.assertEqual([ent.name for ent in df.entities_on_layer('OUTLINE')], ['LINE', 'CIRCLE'])
+        self.assertEqual(df.entities_on_layer('MISSING'), [])
+
+        line = pydxf.entity.LineEntity()
+        line.layer_name = 'NEW'
+        df.sections['ENTITIES'].add_entities(line)
+        assert df.layers is not layers and 'NEW' in df.layers
+        assert df.entities_on_layer('NEW') == [line]
+
+        line.layer_name = 'RENAMED'
+        df.sections['ENTITIES'].entities_changed([line])
+        assert 'RENAMED' in df.layers and 'NEW' not in df.layers
+        assert df.entities_on_layer('RENAMED') == [line]
+
+    def test_layers(self):
+        fd, path = tempfile.mkstemp(suffix='.dxf')
+        try:
+            os.write(fd, '0\nSECTION\n2\nTABLES\n0\nTABLE\n2\nLAYER\n0\nLAYER\n2\nOUTLINE\n62\n3\n0\nENDTAB\n'
+                         '0\nENDSEC\n0\nSECTION\n2\nENTITIES\n0\nLINE\n8\nSILK\n0\nENDSEC\n0\nEOF\n')
+            os.close(fd)
+            files = [pydxf.open_path(path, lazy=lazy) for lazy in (False, True)]
+        finally:
+            os.remove(path)
+        for df in files:
+            self.assertEqual(sorted(df.layers), ['OUTLINE', 'SILK'])
+            self.assertEqual(df.layers['SILK'].name, 'SILK')
+
     def test_list_extend_single(self):
         base_list = [1, 2]
         pydxf.tools.list_extend(base_list, 3)
@@ -182,6 +1087,11 @@ class DxfParseTests(unittest.TestCase):
         assert base_list[2] == 3
         assert base_list[3] == 4
 
+    def test_list_extend_string(self):
+        base_list = [1]
+        pydxf.tools.list_extend(base_list, 'ab')
+        assert base_list == [1, 'a', 'b']
+
     def test_convert_to_meters(self):
         self.assertEqual(pydxf.tools.convert_to_meters(6, 'INCHES'), decimal.Decimal('0.1524'))
         self.assertEqual(pydxf.tools.convert_to_meters(50, 4), decimal.Decimal('0.05'))
@@ -196,5 +1106,42 @@ class DxfParseTests(unittest.TestCase):
         self.assertEqual(pydxf.tools.convert_units(6, 'INCHES', 'NANOMETERS'), decimal.Decimal('152400000'))
         self.assertEqual(pydxf.tools.convert_units(50, 'MILLIMETERS', 'NANOMETERS'), decimal.Decimal('50000000'))
 
+    def test_unit_scale(self):
+        self.assertEqual(pydxf.tools.unit_scale('INCHES', 'MILLIMETERS'), 25.4)
+        self.assertEqual(pydxf.tools.unit_scale(1, 4, exact=True), decimal.Decimal('25.4'))
+        self.assertRaises(ValueError, pydxf.tools.unit_scale, 'FURLONGS', 'METERS')
+
+    def test_normalize_units(self):
+        dxf = '0\nSECTION\n2\nHEADER\n9\n$INSUNITS\n70\n1\n0\nENDSEC\n' + DxfParseTests.ENTITIES
+        for exact in (False, True):
+            df = pydxf.pydxf.DxfFile.make_file(pydxf.tools.ascii_record_iterator(StringIO.StringIO(dxf)))
+            self.assertEqual(df.extents, (0, 0, 5, 5))
+            pydxf.tools.normalize_units(df, 'MILLIMETERS', exact=exact)
+
+            line, circle = df.sections['ENTITIES'][:2]
+            self.assertEqual((line.x1, line.y1, line.x2, line.y2), (0, 0, 0, 25.4))
+            self.assertEqual((circle.x, circle.y, circle.radius), (50.8, 50.8, 50.8))
+            self.assertEqual(df.sections['HEADER']['INSUNITS'], 4)
+            for actual, expected in zip(df.extents, (0, 0, 127, 127)):
+                self.assertAlmostEqual(actual, expected)
+
+            # A coordinate set directly between two calls is scaled from its new value.
+            line.x1 = 10.0
+            entities = df.sections['ENTITIES']
+            changed = []
+            entities.entities_changed = lambda ents, changed_entities=entities.entities_changed: (
+                changed.append(len(ents)), changed_entities(ents))
+            pydxf.tools.normalize_units(df, 'CENTIMETERS', exact=exact)
+            del entities.entities_changed
+            # The section is told about all the scaled entities at once.
+            self.assertEqual(changed, [len(entities)])
+            self.assertAlmostEqual(line.x1, 1.0)
+            self.assertAlmostEqual(line.y2, 2.54)
+
+        df = pydxf.pydxf.DxfFile.make_file(pydxf.tools.ascii_record_iterator(StringIO.StringIO(DxfParseTests.ENTITIES)))
+        self.assertRaises(ValueError, pydxf.tools.normalize_units, df, 'MILLIMETERS')
+        pydxf.tools.normalize_units(df, 'MILLIMETERS', source_units='CENTIMETERS')
+        self.assertEqual(df.sections['ENTITIES'][2].x2, 50)
+
 if __name__ == '__main__':
     unittest.main()